@@ -10,12 +10,18 @@ from custominput_app import custominput_bp
 from nh3balance_app import nh3balance_bp
 from heatpump_app import heatpump_bp
 from heatpumpadv_app import heatpumpadv_bp
+from jobs_app import jobs_bp
+from hp_cascade_app import cascade_bp
+from oandm_app import oandm_bp
 
 ################################### rout to the apps
 app.register_blueprint(custominput_bp, url_prefix='/custominput')
 app.register_blueprint(nh3balance_bp, url_prefix='/nh3balance')
 app.register_blueprint(heatpump_bp, url_prefix='/heatpump')
 app.register_blueprint(heatpumpadv_bp, url_prefix='/heatpumpadv')
+app.register_blueprint(jobs_bp, url_prefix='/jobs')
+app.register_blueprint(cascade_bp, url_prefix='/cascade')
+app.register_blueprint(oandm_bp, url_prefix='/oandm')
 
 #################################### Port
 if __name__ == "__main__":
@@ -24,6 +30,7 @@ if __name__ == "__main__":
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from result_cache import cache_from_env
 
 app = FastAPI(title="G4iE Energy API", version="v1")
 
@@ -50,12 +57,20 @@ class HPSimple(BaseModel):
     lifetime_years: int = 10
     wacc_pct: float = 8
 
+# Memoised /api/v1/run/hp results keyed by the rounded inputs
+run_hp_cache = cache_from_env("run-hp")
+
 @app.get("/api/v1/healthz")
 def healthz():
     return {"ok": True}
 
 @app.post("/api/v1/run/hp")
 def run_hp(m: HPSimple):
+    cache_key = run_hp_cache.key(dict(m))
+    cached = run_hp_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     elec_mw = m.heat_duty_mw / m.cop
     heat_mwh_year = m.heat_duty_mw * 8760 * (m.util_pct/100)
     elec_mwh_year = elec_mw * 8760 * (m.util_pct/100)
@@ -63,7 +78,7 @@ def run_hp(m: HPSimple):
     annualized_capex = m.capex_eur * crf
     opex_eur = elec_mwh_year * m.power_price_eur_per_mwh + m.capex_eur*m.om_frac
     lcoa = (annualized_capex + opex_eur) / heat_mwh_year
-    return {
+    result = {
         "results": {
             "elec_mw": elec_mw,
             "heat_mwh_year": heat_mwh_year,
@@ -72,3 +87,9 @@ def run_hp(m: HPSimple):
             "opex_eur": round(opex_eur, 2),
         }
     }
+    run_hp_cache.set(cache_key, result)
+    return result
+
+@app.get("/api/v1/cache-stats")
+def cache_stats():
+    return run_hp_cache.stats()
@@ -1,63 +1,270 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+import atexit
+import io
+import json
+import os
 import shutil
+import socket
+import threading
+import time as _time
 import traceback
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 from uuid import uuid4
+import numpy as np
 from fmpy import read_model_description, extract
 from fmpy.fmi2 import FMU2Slave
 
 custominput_bp = Blueprint('custominput', __name__)
 
+FMU_FILENAME = 'PumpWithPIDControl.fmu'
+
+# Warm pool settings for instantiated FMUs
+POOL_MAX_SIZE = 4
+POOL_IDLE_TIMEOUT = 300.0  # seconds before an idle pooled instance is freed
+
+# Upper bound on doStep calls per /step-batch request
+MAX_BATCH_STEPS = 1000000
+
+# Upper bound on doStep calls per streamed frame
+MAX_FRAME_STEPS = 10000
+
+# Columns returned for every simulated step, and the binary encodings offered for them
+OUTPUT_COLUMNS = ('time', 'flowSetpoint', 'actualFlow', 'powerConsumption')
+BINARY_FORMATS = ('application/x-npz', 'application/x-npy',
+                  'application/vnd.apache.arrow.stream', 'application/octet-stream')
+
+# Process pool for /batch-run scenario sweeps
+BATCH_WORKERS = int(os.getenv('FMU_BATCH_WORKERS', os.cpu_count() or 1))
+MAX_BATCH_SCENARIOS = 256
+
+# Session limits: idle sessions are evicted after SESSION_IDLE_TTL seconds, and new
+# sessions are refused above MAX_SESSIONS or once the process exceeds MAX_RSS_MB.
+SESSION_IDLE_TTL = float(os.getenv('FMU_SESSION_IDLE_TTL', 900))
+MAX_SESSIONS = int(os.getenv('FMU_MAX_SESSIONS', 50))
+MAX_RSS_MB = float(os.getenv('FMU_MAX_RSS_MB', 0))  # 0 disables the memory limit
+
+# Cookie carrying the owning worker, for load balancers doing sticky routing
+WORKER_COOKIE = 'fmu_worker'
+
+# Maximum number of FMU state snapshots kept in memory (oldest are dropped first)
+MAX_SNAPSHOTS = 100
+
 # Store all sessions here: { session_id: simulation_state }
 sessions = {}
 
-@custominput_bp.route('/start-simulation', methods=['POST'])
-def start_simulation():
-    try:
-        # Create unique session ID
-        session_id = str(uuid4())
+# Lazily created process pool for scenario sweeps
+_scenario_executor = None
+_scenario_executor_lock = threading.Lock()
+
+# Per-process FMU owned by a scenario pool worker
+_worker_fmu = None
+
+# FMU state snapshots in LRU order: { snapshot_id: snapshot }
+_snapshots = OrderedDict()
+_snapshots_lock = threading.Lock()
+
+# Parsed and extracted FMUs, shared by the whole process: { fmu_filename: fmu_info }
+_fmu_cache = {}
+_fmu_cache_lock = threading.Lock()
 
-        # Load the FMU from disk (must be pre-uploaded alongside this script)
-        fmu_filename = 'PumpWithPIDControl.fmu'
-        print(f"[INFO] Starting simulation for session {session_id} using FMU: {fmu_filename}")
+# Idle, already instantiated FMUs: [(fmu, released_at), ...]
+_fmu_pool = []
+_fmu_pool_lock = threading.Lock()
 
-        model_description = read_model_description(fmu_filename)
-        vrs = {var.name: var.valueReference for var in model_description.modelVariables}
 
-        unzipdir = extract(fmu_filename)
-        vr_input = vrs.get('flowSetpoint')
-        vr_actual_flow = vrs.get('actualFlow')
-        vr_power_consumption = vrs.get('powerConsumption')
+def get_fmu_info(fmu_filename=FMU_FILENAME):
+    """Parse and extract the FMU once per process and return the cached info."""
+    with _fmu_cache_lock:
+        info = _fmu_cache.get(fmu_filename)
+        if info is None:
+            print(f"[INFO] Loading FMU {fmu_filename} into process cache")
+            model_description = read_model_description(fmu_filename)
+            vrs = {var.name: var.valueReference for var in model_description.modelVariables}
+            info = {
+                'model_description': model_description,
+                'unzipdir': extract(fmu_filename),
+                'vrs': vrs,
+            }
+            _fmu_cache[fmu_filename] = info
+        return info
 
-        if vr_input is None or vr_actual_flow is None or vr_power_consumption is None:
-            raise Exception("Could not find required variables ('flowSetpoint', 'actualFlow', or 'powerConsumption') in the FMU.")
 
-        # Initialize the FMU
+def _evict_idle_fmus():
+    """Free pooled instances that have been idle longer than POOL_IDLE_TIMEOUT."""
+    now = _time.monotonic()
+    with _fmu_pool_lock:
+        expired = [fmu for fmu, released_at in _fmu_pool if now - released_at > POOL_IDLE_TIMEOUT]
+        _fmu_pool[:] = [(fmu, released_at) for fmu, released_at in _fmu_pool
+                        if now - released_at <= POOL_IDLE_TIMEOUT]
+    for fmu in expired:
+        _free_fmu(fmu)
+
+
+def _free_fmu(fmu):
+    try:
+        fmu.freeInstance()
+    except Exception as e:
+        print(f"[WARNING] Error freeing pooled FMU: {e}")
+
+
+def acquire_fmu(instance_name, fmu_filename=FMU_FILENAME):
+    """Take a reset FMU from the warm pool (or instantiate a new one) and initialize it."""
+    _evict_idle_fmus()
+    info = get_fmu_info(fmu_filename)
+    model_description = info['model_description']
+
+    fmu = None
+    with _fmu_pool_lock:
+        if _fmu_pool:
+            fmu, _ = _fmu_pool.pop()
+
+    if fmu is None:
         fmu = FMU2Slave(
             guid=model_description.guid,
-            unzipDirectory=unzipdir,
+            unzipDirectory=info['unzipdir'],
             modelIdentifier=model_description.coSimulation.modelIdentifier,
-            instanceName=session_id
+            instanceName=instance_name
         )
         fmu.instantiate()
-        fmu.setupExperiment(startTime=0.0)
-        fmu.enterInitializationMode()
-        fmu.exitInitializationMode()
 
-        # Save the simulation state for this session
-        sessions[session_id] = {
-            'fmu': fmu,
-            'time': 0.0,
-            'step_size': 1.e-1,  # 0.1 seconds
-            'stop_time': 31536000,  # 1 year in seconds
-            'threshold': 200.0,  # Optional: you can remove this if not needed
-            'unzipdir': unzipdir,
-            'vr_input': vr_input,
-            'vr_actual_flow': vr_actual_flow,
-            'vr_power_consumption': vr_power_consumption,
-            'done': False
-        }
-
-        return jsonify({'message': 'Simulation started successfully!', 'session_id': session_id})
+    fmu.setupExperiment(startTime=0.0)
+    fmu.enterInitializationMode()
+    fmu.exitInitializationMode()
+    return fmu
+
+
+def release_fmu(fmu):
+    """Terminate and reset an FMU and hand it back to the warm pool, or free it if the pool is full."""
+    try:
+        fmu.terminate()
+        fmu.reset()
+    except Exception as e:
+        print(f"[WARNING] Could not reset FMU for reuse: {e}")
+        _free_fmu(fmu)
+        return
+
+    with _fmu_pool_lock:
+        if len(_fmu_pool) < POOL_MAX_SIZE:
+            _fmu_pool.append((fmu, _time.monotonic()))
+            return
+    _free_fmu(fmu)
+
+
+def worker_id():
+    """Identify this worker process; session and job ids carry it so misrouted requests can be detected."""
+    return os.getenv('FMU_WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def process_rss_mb():
+    """Resident memory of this process in MB."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def evict_idle_sessions():
+    """Clean up sessions that have not been touched for SESSION_IDLE_TTL seconds."""
+    now = _time.monotonic()
+    expired = [sid for sid, sim in list(sessions.items())
+               if not sim.get('streaming') and now - sim['last_access'] > SESSION_IDLE_TTL]
+    for sid in expired:
+        print(f"[INFO] Evicting idle session {sid}")
+        cleanup_session(sid)
+
+
+def get_session(session_id):
+    """Return the live session for session_id (refreshing its idle timer), or None."""
+    evict_idle_sessions()
+    sim = sessions.get(session_id) if session_id else None
+    if sim is not None:
+        sim['last_access'] = _time.monotonic()
+    return sim
+
+
+def missing_session_response(session_id):
+    """Error response for an unknown session; 421 if it belongs to another worker."""
+    owner = session_id.rpartition('@')[2] if session_id and '@' in session_id else None
+    if owner and owner != worker_id():
+        return jsonify({'error': 'Session is owned by another worker.', 'worker': owner}), 421
+    return jsonify({'error': 'Invalid or missing session_id.'}), 400
+
+
+@atexit.register
+def _shutdown_fmu_pool():
+    if _scenario_executor is not None:
+        _scenario_executor.shutdown(cancel_futures=True)
+    with _fmu_pool_lock:
+        pooled = [fmu for fmu, _ in _fmu_pool]
+        _fmu_pool.clear()
+    for fmu in pooled:
+        _free_fmu(fmu)
+    for info in _fmu_cache.values():
+        shutil.rmtree(info['unzipdir'], ignore_errors=True)
+
+
+def create_session():
+    """Start a new session on a pooled FMU and return its session_id."""
+    # Create unique session ID, tagged with the owning worker
+    session_id = f"{uuid4()}@{worker_id()}"
+
+    # Load the FMU from the process cache (must be pre-uploaded alongside this script)
+    print(f"[INFO] Starting simulation for session {session_id} using FMU: {FMU_FILENAME}")
+
+    vrs = get_fmu_info(FMU_FILENAME)['vrs']
+    vr_input = vrs.get('flowSetpoint')
+    vr_actual_flow = vrs.get('actualFlow')
+    vr_power_consumption = vrs.get('powerConsumption')
+
+    if vr_input is None or vr_actual_flow is None or vr_power_consumption is None:
+        raise Exception("Could not find required variables ('flowSetpoint', 'actualFlow', or 'powerConsumption') in the FMU.")
+
+    # Take an initialized FMU from the warm pool
+    fmu = acquire_fmu(session_id)
+
+    # Save the simulation state for this session
+    sessions[session_id] = {
+        'fmu': fmu,
+        'time': 0.0,
+        'step_size': 1.e-1,  # 0.1 seconds
+        'stop_time': 31536000,  # 1 year in seconds
+        'threshold': 200.0,  # Optional: you can remove this if not needed
+        'vr_input': vr_input,
+        'vr_actual_flow': vr_actual_flow,
+        'vr_power_consumption': vr_power_consumption,
+        'last_access': _time.monotonic(),
+        'done': False
+    }
+    return session_id
+
+
+def session_limit_response():
+    """Error response if this worker cannot take another session, else None."""
+    evict_idle_sessions()
+    if len(sessions) >= MAX_SESSIONS:
+        return jsonify({'error': f'Too many active sessions (limit {MAX_SESSIONS}).'}), 503
+    if MAX_RSS_MB and process_rss_mb() > MAX_RSS_MB:
+        return jsonify({'error': 'Worker memory limit reached, try again later.'}), 503
+    return None
+
+
+@custominput_bp.route('/start-simulation', methods=['POST'])
+def start_simulation():
+    try:
+        limit_response = session_limit_response()
+        if limit_response is not None:
+            return limit_response
+
+        session_id = create_session()
+
+        response = jsonify({'message': 'Simulation started successfully!', 'session_id': session_id,
+                            'worker': worker_id()})
+        response.set_cookie(WORKER_COOKIE, worker_id())
+        return response
 
     except Exception as e:
         print(f"[ERROR] Error in /start-simulation: {e}")
@@ -71,10 +278,12 @@ def step_simulation():
     session_id = data.get('session_id')
     input_value = data.get('input_value', 0.0)
 
-    if not session_id or session_id not in sessions:
-        return jsonify({'error': 'Invalid or missing session_id.'}), 400
+    sim = get_session(session_id)
+    if sim is None:
+        return missing_session_response(session_id)
 
-    sim = sessions[session_id]
+    if sim.get('streaming'):
+        return jsonify({'error': 'Session is being streamed; send setpoints to /stream-setpoint.'}), 409
 
     if sim['done']:
         cleanup_session(session_id)
@@ -115,7 +324,686 @@ def step_simulation():
     except Exception as e:
         print(f"[ERROR] Error in /step-simulation for session {session_id}: {e}")
         traceback.print_exc()
+        # The instance may be in an error state, so do not put it back in the pool
+        cleanup_session(session_id, reuse=False)
+        return jsonify({'error': str(e)}), 500
+
+
+def build_schedule(data, step_size):
+    """Turn a batch request into an array of per-step setpoints.
+
+    Accepts either 'inputs': [v0, v1, ...] (one setpoint per step) or
+    'segments': [{'value': v, 'duration': seconds}, ...] (piecewise constant).
+    Raises ValueError for null, NaN or infinite setpoints, which the FMU cannot step with.
+    """
+    if data.get('inputs') is not None:
+        # null becomes NaN here, so this also rejects missing values
+        schedule = np.asarray(data['inputs'], dtype=float).ravel()
+        if not np.isfinite(schedule).all():
+            raise ValueError('Inputs must be finite numbers.')
+        return schedule
+
+    segments = data.get('segments')
+    if not segments:
+        raise ValueError("Provide either 'inputs' or 'segments'.")
+
+    values = []
+    counts = []
+    total = 0
+    for seg in segments:
+        duration = float(seg['duration'])
+        if not np.isfinite(duration) or duration < 0:
+            raise ValueError('Segment duration must be finite and non-negative.')
+        # Check the step count before np.repeat expands it, a huge duration would allocate it all
+        n_steps = int(round(duration / step_size))
+        total += n_steps
+        if total > MAX_BATCH_STEPS:
+            raise ValueError(f'Schedule exceeds the maximum of {MAX_BATCH_STEPS} steps.')
+        value = float(seg['value'])
+        if not np.isfinite(value):
+            raise ValueError('Segment value must be a finite number.')
+        values.append(value)
+        counts.append(n_steps)
+    return np.repeat(np.asarray(values, dtype=float), counts)
+
+
+def run_batch(sim, schedule, decimation=1):
+    """Advance the FMU once per schedule entry and collect every `decimation`-th output.
+
+    Stops early when the session reaches stop_time or actualFlow exceeds the threshold.
+    The last computed step is always included in the output. Outputs are float64 arrays
+    preallocated for the whole schedule and trimmed to the steps actually run.
+    """
+    fmu = sim['fmu']
+    time = sim['time']
+    step_size = sim['step_size']
+    stop_time = sim['stop_time']
+    threshold = sim['threshold']
+    vr_input = [sim['vr_input']]
+    vr_outputs = [sim['vr_actual_flow'], sim['vr_power_consumption']]
+
+    schedule = np.asarray(schedule, dtype=float)
+    n_steps = len(schedule)
+    n_out = n_steps // decimation + (1 if n_steps % decimation else 0)
+    out_time = np.empty(n_out)
+    out_input = np.empty(n_out)
+    out_flow = np.empty(n_out)
+    out_power = np.empty(n_out)
+
+    steps = 0
+    row = 0
+    recorded = True
+
+    for input_value in schedule.tolist():
+        fmu.setReal(vr_input, [input_value])
+        fmu.doStep(currentCommunicationPoint=time, communicationStepSize=step_size)
+        time += step_size
+        steps += 1
+
+        actual_flow, power_consumption = fmu.getReal(vr_outputs)
+
+        recorded = steps % decimation == 0
+        if recorded:
+            out_time[row] = time
+            out_input[row] = input_value
+            out_flow[row] = actual_flow
+            out_power[row] = power_consumption
+            row += 1
+
+        if time >= stop_time or actual_flow > threshold:
+            sim['done'] = True
+            break
+
+    # Make sure the final state is reported even if it falls between decimation points
+    if not recorded:
+        out_time[row] = time
+        out_input[row] = input_value
+        out_flow[row] = actual_flow
+        out_power[row] = power_consumption
+        row += 1
+
+    sim['time'] = time
+    return {
+        'time': out_time[:row],
+        'flowSetpoint': out_input[:row],
+        'actualFlow': out_flow[:row],
+        'powerConsumption': out_power[:row],
+        'steps': steps,
+        'done': sim['done']
+    }
+
+
+def jsonable(out):
+    """Convert NumPy output columns to plain lists for JSON."""
+    return {k: v.tolist() if isinstance(v, np.ndarray) else v for k, v in out.items()}
+
+
+def columnar_response(columns, meta, formats=BINARY_FORMATS):
+    """Encode output columns according to the Accept header.
+
+    JSON (the default) merges columns and meta into one object. Binary formats carry
+    the columns in the body and meta as JSON in the X-Result-Meta header:
+      application/x-npz                     NumPy archive, one array per column
+      application/x-npy                     one structured array with a field per column
+      application/vnd.apache.arrow.stream   Arrow IPC stream (needs pyarrow)
+      application/octet-stream              raw little-endian columns back to back,
+                                            float64 or ?dtype=float32
+    """
+    mimetype = request.accept_mimetypes.best_match(['application/json', *formats],
+                                                   default='application/json')
+    if mimetype == 'application/json':
+        return jsonify({**jsonable(columns), **meta})
+
+    headers = {'X-Result-Meta': json.dumps(meta), 'X-Columns': ','.join(columns)}
+    buf = io.BytesIO()
+
+    if mimetype == 'application/x-npz':
+        np.savez(buf, **columns)
+
+    elif mimetype == 'application/x-npy':
+        n_rows = len(next(iter(columns.values()), []))
+        table = np.empty(n_rows, dtype=[(name, '<f8') for name in columns])
+        for name, values in columns.items():
+            table[name] = values
+        np.save(buf, table)
+
+    elif mimetype == 'application/vnd.apache.arrow.stream':
+        try:
+            import pyarrow as pa
+        except ImportError:
+            return jsonify({'error': 'Arrow output requires pyarrow to be installed.'}), 406
+        table = pa.table({name: np.asarray(values) for name, values in columns.items()})
+        with pa.ipc.new_stream(buf, table.schema) as writer:
+            writer.write_table(table)
+
+    else:
+        dtype = request.args.get('dtype', 'float64')
+        if dtype not in ('float32', 'float64'):
+            return jsonify({'error': 'dtype must be float32 or float64.'}), 400
+        le_dtype = '<f4' if dtype == 'float32' else '<f8'
+        for values in columns.values():
+            buf.write(np.asarray(values, dtype=le_dtype).tobytes())
+        headers['X-Dtype'] = le_dtype
+        headers['X-Rows'] = str(len(next(iter(columns.values()), [])))
+
+    return Response(buf.getvalue(), mimetype=mimetype, headers=headers)
+
+
+@custominput_bp.route('/step-batch', methods=['POST'])
+def step_batch():
+    data = request.get_json()
+    session_id = data.get('session_id')
+
+    sim = get_session(session_id)
+    if sim is None:
+        return missing_session_response(session_id)
+
+    if sim.get('streaming'):
+        return jsonify({'error': 'Session is being streamed; send setpoints to /stream-setpoint.'}), 409
+
+    if sim['done']:
         cleanup_session(session_id)
+        return jsonify({'done': True})
+
+    try:
+        decimation = int(data.get('decimation', 1))
+        schedule = build_schedule(data, sim['step_size'])
+    except (KeyError, TypeError, ValueError, OverflowError) as e:
+        return jsonify({'error': f'Invalid schedule: {e}'}), 400
+
+    if decimation < 1:
+        return jsonify({'error': 'decimation must be >= 1.'}), 400
+    if len(schedule) > MAX_BATCH_STEPS:
+        return jsonify({'error': f'Schedule exceeds the maximum of {MAX_BATCH_STEPS} steps per request.'}), 400
+
+    try:
+        result = run_batch(sim, schedule, decimation)
+
+        if sim['done']:
+            cleanup_session(session_id)
+
+        return columnar_response({k: result[k] for k in OUTPUT_COLUMNS},
+                                 {'steps': result['steps'], 'done': result['done']})
+
+    except Exception as e:
+        print(f"[ERROR] Error in /step-batch for session {session_id}: {e}")
+        traceback.print_exc()
+        cleanup_session(session_id, reuse=False)
+        return jsonify({'error': str(e)}), 500
+
+
+@custominput_bp.route('/stream', methods=['GET'])
+def stream_simulation():
+    """Server-Sent Events stream that advances the session continuously.
+
+    Query parameters:
+      session_id   session to stream
+      rtf          real-time factor (simulated seconds per wall second); 0 runs as fast as possible
+      frame_steps  doStep calls per pushed frame
+      decimation   keep every n-th step inside a frame
+    Setpoint changes are sent to /stream-setpoint while the stream is open.
+    """
+    session_id = request.args.get('session_id')
+
+    sim = get_session(session_id)
+    if sim is None:
+        return missing_session_response(session_id)
+
+    if sim.get('streaming'):
+        return jsonify({'error': 'Session is already being streamed.'}), 409
+
+    try:
+        rtf = float(request.args.get('rtf', 1.0))
+        frame_steps = int(request.args.get('frame_steps', 10))
+        decimation = int(request.args.get('decimation', 1))
+        input_value = float(request.args.get('input_value', sim.get('input_value', 0.0)))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid stream parameter: {e}'}), 400
+
+    if rtf < 0 or decimation < 1 or not 1 <= frame_steps <= MAX_FRAME_STEPS:
+        return jsonify({'error': f'rtf must be >= 0, decimation >= 1 and frame_steps between 1 and {MAX_FRAME_STEPS}.'}), 400
+
+    sim['input_value'] = input_value
+    sim['streaming'] = True
+
+    def generate():
+        wall_start = _time.monotonic()
+        sim_start = sim['time']
+        try:
+            while not sim['done'] and sim.get('streaming'):
+                frame = run_batch(sim, [sim['input_value']] * frame_steps, decimation)
+                # The generator only resumes once the client has consumed the previous
+                # frame, so a slow client throttles the simulation instead of buffering.
+                yield f"data: {json.dumps(jsonable(frame))}\n\n"
+
+                if rtf > 0:
+                    delay = wall_start + (sim['time'] - sim_start) / rtf - _time.monotonic()
+                    if delay > 0:
+                        _time.sleep(delay)
+
+            yield f"event: end\ndata: {json.dumps({'done': sim['done'], 'time': sim['time']})}\n\n"
+
+        except Exception as e:
+            print(f"[ERROR] Error in /stream for session {session_id}: {e}")
+            traceback.print_exc()
+            cleanup_session(session_id, reuse=False)
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+            return
+
+        finally:
+            # Also runs when the client disconnects mid-stream
+            sim['streaming'] = False
+            sim['last_access'] = _time.monotonic()
+
+        if sim['done']:
+            cleanup_session(session_id)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@custominput_bp.route('/stream-setpoint', methods=['POST'])
+def stream_setpoint():
+    """Change the setpoint of a session that is currently being streamed, or stop the stream."""
+    data = request.get_json()
+    session_id = data.get('session_id')
+
+    sim = get_session(session_id)
+    if sim is None:
+        return missing_session_response(session_id)
+
+    if data.get('stop'):
+        sim['streaming'] = False
+        return jsonify({'message': 'Stream stopped.', 'time': sim['time']})
+
+    try:
+        sim['input_value'] = float(data.get('input_value', 0.0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'input_value must be a number.'}), 400
+
+    return jsonify({'input_value': sim['input_value'], 'time': sim['time']})
+
+
+@custominput_bp.route('/sessions', methods=['GET'])
+def session_stats():
+    """Live session count, pool size and memory use of this worker."""
+    evict_idle_sessions()
+    now = _time.monotonic()
+    with _fmu_pool_lock:
+        pooled = len(_fmu_pool)
+    return jsonify({
+        'worker': worker_id(),
+        'active_sessions': len(sessions),
+        'streaming_sessions': sum(1 for sim in sessions.values() if sim.get('streaming')),
+        'pooled_instances': pooled,
+        'max_sessions': MAX_SESSIONS,
+        'idle_ttl_s': SESSION_IDLE_TTL,
+        'oldest_idle_s': max((now - sim['last_access'] for sim in sessions.values()), default=0.0),
+        'rss_mb': round(process_rss_mb(), 1),
+        'max_rss_mb': MAX_RSS_MB or None,
+    })
+
+
+def fmu_state_support():
+    """Return (can_get_set, can_serialize) from the FMU's co-simulation capability flags."""
+    co_simulation = get_fmu_info(FMU_FILENAME)['model_description'].coSimulation
+    return bool(co_simulation.canGetAndSetFMUstate), bool(co_simulation.canSerializeFMUstate)
+
+
+def _free_snapshot(snapshot):
+    """Release the native FMU state held by an in-instance snapshot."""
+    if snapshot['handle'] is None:
+        return
+    sim = sessions.get(snapshot['session_id'])
+    if sim is not None:
+        try:
+            sim['fmu'].freeFMUState(snapshot['handle'])
+        except Exception as e:
+            print(f"[WARNING] Error freeing FMU state for session {snapshot['session_id']}: {e}")
+    snapshot['handle'] = None
+
+
+def store_snapshot(snapshot):
+    """Add a snapshot to the bounded store and return its id."""
+    snapshot_id = str(uuid4())
+    with _snapshots_lock:
+        _snapshots[snapshot_id] = snapshot
+        evicted = []
+        while len(_snapshots) > MAX_SNAPSHOTS:
+            evicted.append(_snapshots.popitem(last=False)[1])
+    for old in evicted:
+        _free_snapshot(old)
+    return snapshot_id
+
+
+def get_snapshot(snapshot_id):
+    with _snapshots_lock:
+        snapshot = _snapshots.get(snapshot_id)
+        if snapshot is not None:
+            _snapshots.move_to_end(snapshot_id)
+        return snapshot
+
+
+def drop_session_snapshots(session_id):
+    """Forget snapshots that reference the session's FMU instance (serialized ones are kept)."""
+    with _snapshots_lock:
+        owned = [sid for sid, snap in _snapshots.items()
+                 if snap['session_id'] == session_id and snap['handle'] is not None]
+        dropped = [_snapshots.pop(sid) for sid in owned]
+    for snapshot in dropped:
+        _free_snapshot(snapshot)
+
+
+def apply_snapshot(sim, snapshot, session_id):
+    """Set the session's FMU to the snapshot state and rewind its bookkeeping."""
+    fmu = sim['fmu']
+    if snapshot['state'] is not None:
+        state = fmu.deserializeFMUState(snapshot['state'])
+        try:
+            fmu.setFMUState(state)
+        finally:
+            fmu.freeFMUState(state)
+    elif snapshot['session_id'] == session_id and snapshot['handle'] is not None:
+        fmu.setFMUState(snapshot['handle'])
+    else:
+        raise ValueError('Snapshot belongs to another session and this FMU cannot serialize its state.')
+
+    sim['time'] = snapshot['time']
+    sim['input_value'] = snapshot['input_value']
+    sim['done'] = False
+
+
+@custominput_bp.route('/snapshot', methods=['POST'])
+def snapshot_session():
+    """Capture the current FMU state of a session."""
+    data = request.get_json()
+    session_id = data.get('session_id')
+
+    can_get_set, can_serialize = fmu_state_support()
+    if not can_get_set:
+        return jsonify({'error': 'This FMU does not support getting and setting its state.'}), 501
+
+    sim = get_session(session_id)
+    if sim is None:
+        return missing_session_response(session_id)
+    if sim.get('streaming'):
+        return jsonify({'error': 'Cannot snapshot a session while it is being streamed.'}), 409
+
+    try:
+        fmu = sim['fmu']
+        handle = fmu.getFMUState()
+        state = None
+        if can_serialize:
+            # Serialized snapshots are independent of the instance and can seed forks
+            state = fmu.serializeFMUState(handle)
+            fmu.freeFMUState(handle)
+            handle = None
+
+        snapshot_id = store_snapshot({
+            'session_id': session_id,
+            'time': sim['time'],
+            'input_value': sim.get('input_value', 0.0),
+            'state': state,
+            'handle': handle,
+        })
+        return jsonify({'snapshot_id': snapshot_id, 'time': sim['time'], 'serialized': state is not None})
+
+    except Exception as e:
+        print(f"[ERROR] Error in /snapshot for session {session_id}: {e}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+
+@custominput_bp.route('/restore', methods=['POST'])
+def restore_session():
+    """Rewind a session to a previously captured snapshot."""
+    data = request.get_json()
+    session_id = data.get('session_id')
+
+    can_get_set, _ = fmu_state_support()
+    if not can_get_set:
+        return jsonify({'error': 'This FMU does not support getting and setting its state.'}), 501
+
+    sim = get_session(session_id)
+    if sim is None:
+        return missing_session_response(session_id)
+    if sim.get('streaming'):
+        return jsonify({'error': 'Cannot restore a session while it is being streamed.'}), 409
+
+    snapshot = get_snapshot(data.get('snapshot_id'))
+    if snapshot is None:
+        return jsonify({'error': 'Invalid or expired snapshot_id.'}), 404
+
+    try:
+        apply_snapshot(sim, snapshot, session_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"[ERROR] Error in /restore for session {session_id}: {e}")
+        traceback.print_exc()
+        cleanup_session(session_id, reuse=False)
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({'session_id': session_id, 'time': sim['time']})
+
+
+@custominput_bp.route('/fork', methods=['POST'])
+def fork_session():
+    """Start a new session from a snapshot, or from the current state of a session."""
+    data = request.get_json()
+    session_id = data.get('session_id')
+    snapshot_id = data.get('snapshot_id')
+
+    can_get_set, can_serialize = fmu_state_support()
+    if not (can_get_set and can_serialize):
+        return jsonify({'error': 'Forking requires an FMU that can serialize its state.'}), 501
+
+    if snapshot_id:
+        snapshot = get_snapshot(snapshot_id)
+        if snapshot is None:
+            return jsonify({'error': 'Invalid or expired snapshot_id.'}), 404
+    else:
+        sim = get_session(session_id)
+        if sim is None:
+            return missing_session_response(session_id)
+        if sim.get('streaming'):
+            return jsonify({'error': 'Cannot fork a session while it is being streamed.'}), 409
+        fmu = sim['fmu']
+        handle = fmu.getFMUState()
+        try:
+            state = fmu.serializeFMUState(handle)
+        finally:
+            fmu.freeFMUState(handle)
+        snapshot = {'session_id': session_id, 'time': sim['time'],
+                    'input_value': sim.get('input_value', 0.0), 'state': state, 'handle': None}
+
+    limit_response = session_limit_response()
+    if limit_response is not None:
+        return limit_response
+
+    new_session_id = None
+    try:
+        new_session_id = create_session()
+        apply_snapshot(sessions[new_session_id], snapshot, new_session_id)
+    except Exception as e:
+        print(f"[ERROR] Error in /fork: {e}")
+        traceback.print_exc()
+        if new_session_id:
+            cleanup_session(new_session_id, reuse=False)
+        return jsonify({'error': str(e)}), 500
+
+    response = jsonify({'session_id': new_session_id, 'time': snapshot['time'], 'worker': worker_id()})
+    response.set_cookie(WORKER_COOKIE, worker_id())
+    return response
+
+
+def _init_scenario_worker(unzipdir):
+    """Process pool initializer: instantiate one FMU from the parent's extracted directory."""
+    global _worker_fmu
+    model_description = read_model_description(unzipdir)
+    vrs = {var.name: var.valueReference for var in model_description.modelVariables}
+    fmu = FMU2Slave(
+        guid=model_description.guid,
+        unzipDirectory=unzipdir,
+        modelIdentifier=model_description.coSimulation.modelIdentifier,
+        instanceName=f'scenario-worker-{os.getpid()}'
+    )
+    fmu.instantiate()
+    _worker_fmu = {'fmu': fmu, 'vrs': vrs}
+
+
+def scenario_step_size(scenario):
+    """A scenario's step_size in seconds; raises ValueError unless it is finite and positive."""
+    step_size = float(scenario.get('step_size', 1.e-1))
+    if not np.isfinite(step_size) or step_size <= 0:
+        raise ValueError('step_size must be a finite number > 0.')
+    return step_size
+
+
+def scenario_limits(scenario):
+    """A scenario's (stop_time, threshold); raises ValueError unless both are finite numbers."""
+    stop_time = float(scenario.get('stop_time', 31536000))
+    threshold = float(scenario.get('threshold', 200.0))
+    if not (np.isfinite(stop_time) and np.isfinite(threshold)):
+        raise ValueError('stop_time and threshold must be finite numbers.')
+    return stop_time, threshold
+
+
+def _run_scenario(scenario):
+    """Run one scenario to completion on this worker's FMU and summarise it."""
+    fmu = _worker_fmu['fmu']
+    vrs = _worker_fmu['vrs']
+    # Parse everything before touching the FMU
+    step_size = scenario_step_size(scenario)
+    stop_time, threshold = scenario_limits(scenario)
+    decimation = int(scenario.get('decimation', 1))
+    schedule = build_schedule(scenario, step_size)
+
+    sim = {
+        'fmu': fmu,
+        'time': 0.0,
+        'step_size': step_size,
+        'stop_time': stop_time,
+        'threshold': threshold,
+        'vr_input': vrs['flowSetpoint'],
+        'vr_actual_flow': vrs['actualFlow'],
+        'vr_power_consumption': vrs['powerConsumption'],
+        'done': False
+    }
+    try:
+        fmu.setupExperiment(startTime=0.0)
+        fmu.enterInitializationMode()
+        fmu.exitInitializationMode()
+        # Summaries use every step, the returned series is decimated afterwards
+        out = run_batch(sim, schedule)
+    finally:
+        # Always leave the FMU reset for the next scenario, an initialised one crashes setupExperiment
+        try:
+            fmu.terminate()
+        finally:
+            fmu.reset()
+
+    actual_flow = out['actualFlow']
+    power = out['powerConsumption']
+    summary = {
+        'steps': out['steps'],
+        'end_time': sim['time'],
+        'done': out['done'],
+        'energy': float(power.sum() * step_size),
+        'peak_flow': float(actual_flow.max()) if actual_flow.size else None,
+        'mean_flow': float(actual_flow.mean()) if actual_flow.size else None,
+        'peak_power': float(power.max()) if power.size else None,
+    }
+
+    series = {}
+    for key in OUTPUT_COLUMNS:
+        values = out[key][decimation - 1::decimation]
+        # Keep the final point, as run_batch does for decimated output
+        if out['steps'] % decimation:
+            values = np.append(values, out[key][-1])
+        series[key] = values
+
+    return {'name': scenario.get('name'), 'summary': summary, 'series': series}
+
+
+def get_scenario_executor():
+    """Process pool with one FMU per worker, sharing this process's extracted FMU directory."""
+    global _scenario_executor
+    with _scenario_executor_lock:
+        # A crashed worker breaks the whole pool; replace it so later batches still run
+        if _scenario_executor is not None and getattr(_scenario_executor, '_broken', False):
+            print("[WARNING] Scenario worker pool is broken, restarting it")
+            _scenario_executor.shutdown(wait=False, cancel_futures=True)
+            _scenario_executor = None
+        if _scenario_executor is None:
+            unzipdir = get_fmu_info(FMU_FILENAME)['unzipdir']
+            _scenario_executor = ProcessPoolExecutor(
+                max_workers=BATCH_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_scenario_worker,
+                initargs=(unzipdir,)
+            )
+        return _scenario_executor
+
+
+@custominput_bp.route('/batch-run', methods=['POST'])
+def batch_run():
+    """Run a list of flowSetpoint scenarios to completion in parallel.
+
+    Each scenario takes 'inputs' or 'segments' as in /step-batch, plus optional
+    'name', 'decimation', 'step_size', 'stop_time' and 'threshold'. A scenario that
+    fails while running gets {'name', 'error'} in place of its summary and series.
+    """
+    data = request.get_json()
+    scenarios = data.get('scenarios')
+
+    if not scenarios or not isinstance(scenarios, list):
+        return jsonify({'error': "Provide a non-empty 'scenarios' list."}), 400
+    if len(scenarios) > MAX_BATCH_SCENARIOS:
+        return jsonify({'error': f'At most {MAX_BATCH_SCENARIOS} scenarios per request.'}), 400
+
+    # Validate schedules here so bad input fails fast instead of inside the pool
+    try:
+        for scenario in scenarios:
+            if int(scenario.get('decimation', 1)) < 1:
+                raise ValueError('decimation must be >= 1.')
+            scenario_limits(scenario)
+            build_schedule(scenario, scenario_step_size(scenario))
+    except (AttributeError, KeyError, TypeError, ValueError, OverflowError) as e:
+        return jsonify({'error': f'Invalid scenario: {e}'}), 400
+
+    try:
+        start = _time.perf_counter()
+        executor = get_scenario_executor()
+        futures = [executor.submit(_run_scenario, scenario) for scenario in scenarios]
+        results = []
+        for scenario, future in zip(scenarios, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"[WARNING] Scenario {scenario.get('name')!r} failed in /batch-run: {e}")
+                results.append({'name': scenario.get('name'), 'error': str(e)})
+        meta = {'workers': BATCH_WORKERS, 'elapsed_s': round(_time.perf_counter() - start, 3)}
+
+        # Scenario series differ in length, so only NumPy archives work as a binary format;
+        # columns are keyed '<scenario index>_<column>' and summaries go into the meta header.
+        if request.accept_mimetypes.best_match(['application/json', 'application/x-npz']) == 'application/x-npz':
+            columns = {f'{i}_{key}': values for i, result in enumerate(results)
+                       for key, values in result.get('series', {}).items()}
+            meta['scenarios'] = [{k: v for k, v in r.items() if k != 'series'} for r in results]
+            return columnar_response(columns, meta, formats=('application/x-npz',))
+
+        for result in results:
+            if 'series' in result:
+                result['series'] = jsonable(result['series'])
+        return jsonify({'results': results, **meta})
+
+    except Exception as e:
+        print(f"[ERROR] Error in /batch-run: {e}")
+        traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
 
@@ -124,15 +1012,18 @@ def home():
     return 'Real-Time FMU Simulation API (multi-user ready)'
 
 
-def cleanup_session(session_id):
-    """Free resources and remove the session."""
+def cleanup_session(session_id, reuse=True):
+    """Remove the session and return its FMU to the warm pool (or free it if reuse is False)."""
+    # In-instance FMU states must be freed while the instance is still alive
+    drop_session_snapshots(session_id)
     sim = sessions.pop(session_id, None)
     if sim:
         print(f"[INFO] Cleaning up session {session_id}")
+        if reuse:
+            release_fmu(sim['fmu'])
+            return
         try:
             sim['fmu'].terminate()
-            sim['fmu'].freeInstance()
         except Exception as e:
             print(f"[WARNING] Error cleaning up FMU for session {session_id}: {e}")
-        if sim['unzipdir']:
-            shutil.rmtree(sim['unzipdir'], ignore_errors=True)
+        _free_fmu(sim['fmu'])
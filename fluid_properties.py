@@ -0,0 +1,193 @@
+"""Shared CoolProp property lookups for the heat pump apps.
+
+Saturation lookups are memoised per process. Setting PROPERTY_BACKEND to a tabular
+CoolProp backend ('BICUBIC&HEOS' or 'TTSE&HEOS') switches both these lookups and
+the TESPy networks (through tespy_fluid) to interpolation tables for the fluids in
+TABULAR_FLUIDS; other fluids stay on HEOS. CoolProp builds the tables on first use
+(several seconds per fluid) and caches them under ~/.CoolProp.
+
+    python fluid_properties.py --backend 'BICUBIC&HEOS'
+
+prints the accuracy and speed of a backend against HEOS.
+"""
+import argparse
+import os
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
+import CoolProp.CoolProp as CP
+from CoolProp.CoolProp import AbstractState
+
+PROPERTY_BACKEND = os.getenv('PROPERTY_BACKEND', 'HEOS')
+TABULAR_BACKENDS = ('BICUBIC&HEOS', 'TTSE&HEOS')
+
+# Canonical CoolProp names of the fluids the tabular backend is used for (NH3, R134a,
+# propane, isobutane, water); aliases are resolved through CoolProp
+TABULAR_FLUIDS = {'Ammonia', 'R134a', 'n-Propane', 'IsoButane', 'Water'}
+
+# Temperatures are rounded to this many decimals before a memoised lookup
+DECIMALS = 6
+
+# AbstractState instances are not thread-safe, so each thread gets its own
+_local = threading.local()
+
+
+def backend_for(fluid, backend=None):
+    """Backend used for a fluid: the tabular one only for TABULAR_FLUIDS."""
+    backend = backend or PROPERTY_BACKEND
+    if backend in TABULAR_BACKENDS and CP.get_fluid_param_string(fluid, 'name') not in TABULAR_FLUIDS:
+        return 'HEOS'
+    return backend
+
+
+def tespy_fluid(fluid, backend=None):
+    """Fluid name for a TESPy fluid specification, with the backend prefix if it is not HEOS."""
+    backend = backend_for(fluid, backend)
+    return fluid if backend == 'HEOS' else f'{backend}::{fluid}'
+
+
+def _state(fluid, backend=None):
+    states = getattr(_local, 'states', None)
+    if states is None:
+        states = _local.states = {}
+    backend = backend_for(fluid, backend)
+    key = (backend, fluid)
+    if key not in states:
+        states[key] = AbstractState(backend, fluid)
+    return states[key]
+
+
+@lru_cache(maxsize=4096)
+def _saturation(fluid, T, Q, backend):
+    state = _state(fluid, backend)
+    state.update(CP.QT_INPUTS, Q, T)
+    return state.p(), state.hmass()
+
+
+def saturation_pressure(fluid, T, Q=1, backend=None):
+    """Saturation pressure in Pa at T in K (Q=0 bubble, Q=1 dew point)."""
+    return _saturation(fluid, round(float(T), DECIMALS), Q, backend_for(fluid, backend))[0]
+
+
+def saturation_enthalpy(fluid, T, Q=1, backend=None):
+    """Saturated liquid (Q=0) or vapour (Q=1) enthalpy in J/kg at T in K."""
+    return _saturation(fluid, round(float(T), DECIMALS), Q, backend_for(fluid, backend))[1]
+
+
+def cache_info():
+    info = _saturation.cache_info()
+    return {'backend': PROPERTY_BACKEND, 'hits': info.hits, 'misses': info.misses,
+            'entries': info.currsize, 'max_entries': info.maxsize}
+
+
+@lru_cache(maxsize=None)
+def accuracy(fluid, backend=None, samples=200):
+    """Largest relative deviation of a backend from HEOS for one fluid, and its speed-up.
+
+    Checks the lookups the solvers make: saturation pressure and bubble/dew enthalpy
+    from 0.6 to 0.95 of the critical temperature, and temperature and density from
+    (p, h) for two-phase, liquid and superheated vapour states at those pressures.
+    """
+    backend = backend_for(fluid, backend)
+    reference = AbstractState('HEOS', fluid)
+    state = AbstractState(backend, fluid)
+    T_crit = reference.T_critical()
+
+    temperatures = np.linspace(0.6 * T_crit, 0.95 * T_crit, samples)
+
+    # (p, h) points from HEOS: subcooled 5 K, wet (x=0.5), superheated 5 and 50 K
+    ph_points = []
+    for T in temperatures:
+        reference.update(CP.QT_INPUTS, 0, T)
+        p = reference.p()
+        reference.update(CP.PT_INPUTS, p, T - 5)
+        ph_points.append((p, reference.hmass()))
+        reference.update(CP.QT_INPUTS, 0.5, T)
+        ph_points.append((p, reference.hmass()))
+        for superheat in (5, 50):
+            reference.update(CP.PT_INPUTS, p, T + superheat)
+            ph_points.append((p, reference.hmass()))
+
+    def evaluate(s):
+        saturation = []
+        for T in temperatures:
+            for Q in (0, 1):
+                s.update(CP.QT_INPUTS, Q, T)
+                saturation += [s.p(), s.hmass()]
+        ph = []
+        for p, h in ph_points:
+            s.update(CP.HmassP_INPUTS, h, p)
+            ph += [s.T(), s.rhomass()]
+        return np.array(saturation), np.array(ph)
+
+    evaluate(state)  # builds or loads the tables outside the timing
+    start = time.perf_counter()
+    reference_saturation, reference_ph = evaluate(reference)
+    reference_time = time.perf_counter() - start
+    start = time.perf_counter()
+    saturation, ph = evaluate(state)
+    backend_time = time.perf_counter() - start
+
+    def max_rel(values, reference_values):
+        return float(np.max(np.abs(values - reference_values) / np.abs(reference_values)))
+
+    return {
+        'fluid': fluid,
+        'backend': backend,
+        'saturation_max_rel_error': max_rel(saturation, reference_saturation),
+        'ph_max_rel_error': max_rel(ph, reference_ph),
+        'speedup': reference_time / backend_time if backend_time else None,
+    }
+
+
+def accuracy_report(backend=None, fluids=sorted(TABULAR_FLUIDS)):
+    """accuracy() for every tabular fluid."""
+    return [accuracy(fluid, backend) for fluid in fluids]
+
+
+# Report for PROPERTY_BACKEND, computed once in the background by start_accuracy_report
+_accuracy_report = None
+_accuracy_thread = None
+_accuracy_lock = threading.Lock()
+
+
+def _compute_accuracy_report():
+    global _accuracy_report
+    try:
+        _accuracy_report = accuracy_report()
+    except Exception as e:
+        print(f"[WARNING] Could not compute the {PROPERTY_BACKEND} accuracy report: {e}")
+        _accuracy_report = []
+
+
+def start_accuracy_report():
+    """Build the tables and the accuracy report of a tabular PROPERTY_BACKEND in a background thread, once."""
+    global _accuracy_thread
+    if PROPERTY_BACKEND not in TABULAR_BACKENDS:
+        return
+    with _accuracy_lock:
+        if _accuracy_thread is None:
+            _accuracy_thread = threading.Thread(target=_compute_accuracy_report, daemon=True,
+                                                name='property-accuracy')
+            _accuracy_thread.start()
+
+
+def cached_accuracy_report():
+    """The report started by start_accuracy_report, [] for HEOS, or None while it is being computed."""
+    if PROPERTY_BACKEND not in TABULAR_BACKENDS:
+        return []
+    start_accuracy_report()
+    return _accuracy_report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare a CoolProp backend with HEOS.')
+    parser.add_argument('--backend', default=PROPERTY_BACKEND)
+    args = parser.parse_args()
+
+    for entry in accuracy_report(args.backend):
+        print(f"{entry['fluid']:10s} {entry['backend']:14s} max rel. error: saturation "
+              f"{entry['saturation_max_rel_error']:.1e}, T/rho(p, h) {entry['ph_max_rel_error']:.1e}  "
+              f"speed-up {entry['speedup']:.1f}x")
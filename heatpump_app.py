@@ -1,10 +1,111 @@
 from flask import Blueprint, request, jsonify
+import itertools
+import math
+import threading
+from collections import OrderedDict
 from tespy.networks import Network
 from tespy.components import CycleCloser, Compressor, Valve, SimpleHeatExchanger
 from tespy.connections import Connection
+from result_cache import cache_from_env
+from fluid_properties import PROPERTY_BACKEND, cache_info, cached_accuracy_report, start_accuracy_report, tespy_fluid
+from heatpump_surrogate import predict as predict_surrogate
 
 heatpump_bp = Blueprint('heatpump', __name__)
 
+# Upper bound on operating points per /sweep request
+MAX_SWEEP_POINTS = 5000
+
+# Topology name used in the network cache key
+TOPOLOGY = 'simple-cycle'
+
+# Solved networks kept per process, least recently used evicted first
+MAX_CACHED_NETWORKS = 8
+
+# { (topology, fluid): model } in LRU order; a model is removed while in use
+_network_cache = OrderedDict()
+_network_cache_lock = threading.Lock()
+
+# Memoised /simulate responses keyed by the rounded inputs
+simulate_cache = cache_from_env('heatpump-simulate')
+
+# With a tabular property backend, build its tables and accuracy report off the request path
+start_accuracy_report()
+
+
+def build_heatpump_network(fluid):
+    """Create the simple heat pump network for one fluid; returns the parts needed to re-solve it."""
+    # Create TESPy network
+    my_plant = Network(fluids=[fluid])
+    my_plant.set_attr(T_unit='C', p_unit='bar', h_unit='kJ / kg', iterinfo=False)
+
+    # Components
+    cc = CycleCloser('cycle closer')
+    co = SimpleHeatExchanger('condenser')
+    ev = SimpleHeatExchanger('evaporator')
+    va = Valve('expansion valve')
+    cp = Compressor('compressor')
+
+    # Connections
+    c1 = Connection(cc, 'out1', ev, 'in1', label='1')
+    c2 = Connection(ev, 'out1', cp, 'in1', label='2')
+    c3 = Connection(cp, 'out1', co, 'in1', label='3')
+    c4 = Connection(co, 'out1', va, 'in1', label='4')
+    c0 = Connection(va, 'out1', cc, 'in1', label='0')
+    my_plant.add_conns(c1, c2, c3, c4, c0)
+
+    # Set component attributes
+    co.set_attr(pr=0.98)
+    ev.set_attr(pr=0.98)
+    cp.set_attr(eta_s=0.85)
+
+    # Set connection attributes
+    c2.set_attr(x=1, fluid={tespy_fluid(fluid): 1})
+    c4.set_attr(x=0)
+
+    return {'network': my_plant, 'fluid': fluid, 'co': co, 'cp': cp, 'c2': c2, 'c4': c4}
+
+
+def solve_heatpump(model, evap_T, cond_T, Q_cond):
+    """Solve the model at one operating point, starting from its previous solution if any."""
+    model['co'].set_attr(Q=-Q_cond * 1e3)  # Convert kW to W, negative because heat is removed
+    model['c2'].set_attr(T=evap_T)
+    model['c4'].set_attr(T=cond_T)
+
+    # Solve the network
+    model['network'].solve(mode='design', print_results=False)
+
+    # Calculate COP and outputs
+    co = model['co']
+    cp = model['cp']
+    return {
+        'COP': abs(co.Q.val) / cp.P.val,
+        'cp_power_kW': cp.P.val / 1e3,  # W to kW
+        'condenser_Q_kW': abs(co.Q.val) / 1e3,  # W to kW
+        'converged': model['network'].converged,
+    }
+
+
+def checkout_network(fluid):
+    """Take the cached solved network for this fluid (or build a new one) for exclusive use."""
+    with _network_cache_lock:
+        model = _network_cache.pop((TOPOLOGY, fluid), None)
+    if model is None:
+        model = build_heatpump_network(fluid)
+    return model
+
+
+def checkin_network(model):
+    """Return a converged network to the cache so the next solve can start from its state."""
+    key = (TOPOLOGY, model['fluid'])
+    with _network_cache_lock:
+        # A concurrent request may already have returned a network for this fluid
+        if key in _network_cache:
+            return
+        _network_cache[key] = model
+        while len(_network_cache) > MAX_CACHED_NETWORKS:
+            _network_cache.popitem(last=False)
+
+
 @heatpump_bp.route('/simulate', methods=['GET'])
 def simulate_heatpump():
     try:
@@ -13,53 +114,192 @@ def simulate_heatpump():
         cond_T = float(request.args.get('cond_T', 80))     # °C
         fluid = request.args.get('fluid', 'R134a')
         Q_cond = float(request.args.get("Q_cond", 1000))   # in kW
+        mode = request.args.get('mode', 'full')             # 'full' or 'surrogate'
+
+        if mode == 'surrogate':
+            prediction = predict_surrogate(fluid, evap_T, cond_T, Q_cond)
+            if prediction is not None:
+                return jsonify({
+                    'status': 'success',
+                    'mode': 'surrogate',
+                    'COP': round(prediction['COP'], 3),
+                    'cp_power_kW': round(prediction['cp_power_kW'], 2),
+                    'condenser_Q_kW': round(prediction['condenser_Q_kW'], 2),
+                    'error_bound': prediction['error_bound'],
+                    'inputs': {
+                        'evaporator_T_C': evap_T,
+                        'condenser_T_C': cond_T,
+                        'fluid': fluid,
+                        'Q_cond': Q_cond
+                    }
+                })
+            # Outside the trained region (or no surrogate for this fluid): fall through to the full solve
 
-        # Create TESPy network
-        my_plant = Network(fluids=[fluid])
-        my_plant.set_attr(T_unit='C', p_unit='bar', h_unit='kJ / kg')
-
-        # Components
-        cc = CycleCloser('cycle closer')
-        co = SimpleHeatExchanger('condenser')
-        ev = SimpleHeatExchanger('evaporator')
-        va = Valve('expansion valve')
-        cp = Compressor('compressor')
-
-        # Connections
-        c1 = Connection(cc, 'out1', ev, 'in1', label='1')
-        c2 = Connection(ev, 'out1', cp, 'in1', label='2')
-        c3 = Connection(cp, 'out1', co, 'in1', label='3')
-        c4 = Connection(co, 'out1', va, 'in1', label='4')
-        c0 = Connection(va, 'out1', cc, 'in1', label='0')
-        my_plant.add_conns(c1, c2, c3, c4, c0)
-
-        # Set component attributes
-        co.set_attr(pr=0.98, Q=-Q_cond * 1e3)  # Convert kW to W, negative because heat is removed
-        ev.set_attr(pr=0.98)
-        cp.set_attr(eta_s=0.85)
-
-        # Set connection attributes
-        c2.set_attr(T=evap_T, x=1, fluid={fluid: 1})
-        c4.set_attr(T=cond_T, x=0)
-
-        # Solve the network
-        my_plant.solve(mode='design')
-
-        # Calculate COP and outputs
-        cop = abs(co.Q.val) / cp.P.val
-
-        return jsonify({
+        cache_key = simulate_cache.key({'evap_T': evap_T, 'cond_T': cond_T, 'fluid': fluid, 'Q_cond': Q_cond,
+                                         'backend': PROPERTY_BACKEND})
+        payload = simulate_cache.get(cache_key)
+        if payload is not None:
+            response = jsonify(payload)
+            response.headers['X-Cache'] = 'hit'
+            if mode == 'surrogate':
+                response.headers['X-Surrogate'] = 'fallback'
+            return response
+
+        model = checkout_network(fluid)
+        result = solve_heatpump(model, evap_T, cond_T, Q_cond)
+        # Only converged states are worth warm-starting from or remembering
+        if result['converged']:
+            checkin_network(model)
+
+        payload = {
             'status': 'success',
-            'COP': round(cop, 3),
-            'cp_power_kW': round(cp.P.val / 1e3, 2),  # W to kW
-            'condenser_Q_kW': round(abs(co.Q.val) / 1e3, 2),  # W to kW
+            'COP': round(result['COP'], 3),
+            'cp_power_kW': round(result['cp_power_kW'], 2),
+            'condenser_Q_kW': round(result['condenser_Q_kW'], 2),
             'inputs': {
                 'evaporator_T_C': evap_T,
                 'condenser_T_C': cond_T,
                 'fluid': fluid,
                 'Q_cond': Q_cond
             }
-        })
+        }
+        if result['converged']:
+            simulate_cache.set(cache_key, payload)
+
+        response = jsonify(payload)
+        response.headers['X-Cache'] = 'miss'
+        if mode == 'surrogate':
+            response.headers['X-Surrogate'] = 'fallback'
+        return response
 
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
+
+
+@heatpump_bp.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    return jsonify(simulate_cache.stats())
+
+
+@heatpump_bp.route('/properties', methods=['GET'])
+def property_stats():
+    """Property backend in use, its saturation lookup cache and, for a tabular backend, its accuracy.
+
+    The accuracy report is computed once in the background at startup; it is null until ready.
+    """
+    return jsonify({
+        'backend': PROPERTY_BACKEND,
+        'cache': cache_info(),
+        'accuracy': cached_accuracy_report(),
+    })
+
+
+def sweep_points(data):
+    """Expand a sweep request into (fluid, evap_T, cond_T, Q_cond) tuples, grouped by fluid.
+
+    Either 'points': [{'evap_T', 'cond_T', 'Q_cond', 'fluid'}, ...] or a grid given as
+    lists (or scalars) for 'evap_T', 'cond_T', 'Q_cond' and 'fluid'. Grid points are
+    produced with Q_cond varying fastest so neighbouring points are close to each other.
+    Raises ValueError for more than MAX_SWEEP_POINTS points, before building the grid.
+    """
+    default_fluid = data.get('fluid', 'R134a')
+
+    if data.get('points') is not None:
+        if len(data['points']) > MAX_SWEEP_POINTS:
+            raise ValueError(f'At most {MAX_SWEEP_POINTS} points per sweep.')
+        points = [
+            (p.get('fluid', default_fluid), float(p.get('evap_T', 20)),
+             float(p.get('cond_T', 80)), float(p.get('Q_cond', 1000)))
+            for p in data['points']
+        ]
+    else:
+        def axis(name, default):
+            values = data.get(name, default)
+            return values if isinstance(values, list) else [values]
+
+        axes = [axis('fluid', default_fluid), axis('evap_T', 20), axis('cond_T', 80), axis('Q_cond', 1000)]
+        if math.prod(len(values) for values in axes) > MAX_SWEEP_POINTS:
+            raise ValueError(f'At most {MAX_SWEEP_POINTS} points per sweep.')
+
+        points = [
+            (fluid, float(evap_T), float(cond_T), float(Q_cond))
+            for fluid, evap_T, cond_T, Q_cond in itertools.product(*axes)
+        ]
+
+    # Stable sort keeps the requested order within each fluid
+    order = sorted(range(len(points)), key=lambda i: points[i][0])
+    return points, order
+
+
+def run_sweep(data, progress=None):
+    """Solve many operating points, building the network once per fluid and warm-starting each solve.
+
+    `progress`, if given, is called with keyword updates (point, points) as the sweep advances.
+    Raises ValueError for an invalid sweep.
+    """
+    report = progress or (lambda **info: None)
+    try:
+        points, order = sweep_points(data)
+    except (AttributeError, TypeError, ValueError) as e:
+        raise ValueError(f'Invalid sweep: {e}')
+
+    if not points:
+        raise ValueError('Sweep has no operating points.')
+    if len(points) > MAX_SWEEP_POINTS:
+        raise ValueError(f'At most {MAX_SWEEP_POINTS} points per sweep.')
+
+    n = len(points)
+    cop = [None] * n
+    cp_power = [None] * n
+    q_cond = [None] * n
+    converged = [False] * n
+    errors = {}
+
+    model = None
+    for k, i in enumerate(order):
+        report(point=k, points=n)
+        fluid, evap_T, cond_T, Q_cond = points[i]
+        try:
+            if model is None or model['fluid'] != fluid:
+                if model is not None:
+                    checkin_network(model)
+                model = checkout_network(fluid)
+            result = solve_heatpump(model, evap_T, cond_T, Q_cond)
+        except Exception as e:
+            errors[i] = str(e)
+            # Do not warm-start the next point from a failed solve
+            model = None
+            continue
+
+        converged[i] = result['converged']
+        if not result['converged']:
+            model = None
+            continue
+        cop[i] = result['COP']
+        cp_power[i] = result['cp_power_kW']
+        q_cond[i] = result['condenser_Q_kW']
+
+    if model is not None:
+        checkin_network(model)
+
+    return {
+        'status': 'success',
+        'fluid': [p[0] for p in points],
+        'evap_T': [p[1] for p in points],
+        'cond_T': [p[2] for p in points],
+        'Q_cond': [p[3] for p in points],
+        'COP': cop,
+        'cp_power_kW': cp_power,
+        'condenser_Q_kW': q_cond,
+        'converged': converged,
+        'errors': {str(i): msg for i, msg in errors.items()},
+    }
+
+
+@heatpump_bp.route('/sweep', methods=['POST'])
+def sweep_heatpump():
+    """Solve many operating points in one request, see run_sweep."""
+    try:
+        return jsonify(run_sweep(request.get_json()))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
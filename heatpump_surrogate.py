@@ -0,0 +1,184 @@
+"""Surrogate COP model for the simple heat pump in heatpump_app.
+
+Train offline (takes a few minutes per fluid):
+
+    python heatpump_surrogate.py --fluids R134a NH3 propane isobutane
+
+This samples the TESPy network over (evap_T, cond_T, Q_cond), fits one
+tensor-product spline per fluid and writes a versioned JSON file that
+/heatpump/simulate?mode=surrogate loads on first use.
+"""
+import argparse
+import json
+import os
+import threading
+
+import numpy as np
+from scipy.interpolate import RectBivariateSpline, bisplev
+
+SURROGATE_VERSION = 1
+SURROGATE_PATH = os.getenv('HEATPUMP_SURROGATE_PATH', 'heatpump_surrogate.json')
+
+DEFAULT_FLUIDS = ['R134a', 'NH3', 'propane', 'isobutane']
+DEFAULT_EVAP_T = np.arange(-10.0, 30.0 + 1e-9, 2.5)   # °C
+DEFAULT_COND_T = np.arange(40.0, 90.0 + 1e-9, 2.5)    # °C
+DEFAULT_Q_COND = np.array([100.0, 1000.0, 10000.0])   # kW
+
+# { path: (mtime, surrogates) } so a retrained file is picked up without a restart
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def _solve_grid(fluid, evap_grid, cond_grid, q_cond):
+    """COP over the (evap_T, cond_T) grid at one Q_cond, warm-starting along cond_T."""
+    from heatpump_app import build_heatpump_network, solve_heatpump
+
+    cop = np.empty((len(evap_grid), len(cond_grid)))
+    model = build_heatpump_network(fluid)
+    for i, evap_T in enumerate(evap_grid):
+        for j, cond_T in enumerate(cond_grid):
+            result = solve_heatpump(model, evap_T, cond_T, q_cond)
+            if not result['converged']:
+                # Retry from a cold start before giving up on the point
+                model = build_heatpump_network(fluid)
+                result = solve_heatpump(model, evap_T, cond_T, q_cond)
+                if not result['converged']:
+                    raise RuntimeError(f'{fluid}: no convergence at evap_T={evap_T}, cond_T={cond_T}')
+            cop[i, j] = result['COP']
+    return cop
+
+
+def train_fluid(fluid, evap_grid=DEFAULT_EVAP_T, cond_grid=DEFAULT_COND_T, q_grid=DEFAULT_Q_COND):
+    """Fit COP(evap_T, cond_T) for one fluid and measure its error on cell midpoints.
+
+    With fixed pressure ratios and isentropic efficiency the cycle scales linearly
+    with Q_cond, so COP is fitted over temperatures only. Every Q_cond sample is
+    still solved and folded into the error bound, so a model change that breaks
+    the scaling shows up as a larger bound instead of going unnoticed.
+    """
+    evap_grid = np.asarray(evap_grid, dtype=float)
+    cond_grid = np.asarray(cond_grid, dtype=float)
+    q_grid = np.asarray(q_grid, dtype=float)
+
+    samples = [_solve_grid(fluid, evap_grid, cond_grid, q) for q in q_grid]
+    spline = RectBivariateSpline(evap_grid, cond_grid, np.mean(samples, axis=0), kx=3, ky=3)
+
+    # Validate off-grid, at the centre of every cell
+    evap_mid = (evap_grid[:-1] + evap_grid[1:]) / 2
+    cond_mid = (cond_grid[:-1] + cond_grid[1:]) / 2
+    predicted = spline(evap_mid, cond_mid)
+    abs_err = 0.0
+    rel_err = 0.0
+    for q in q_grid:
+        actual = _solve_grid(fluid, evap_mid, cond_mid, q)
+        abs_err = max(abs_err, float(np.max(np.abs(predicted - actual))))
+        rel_err = max(rel_err, float(np.max(np.abs(predicted - actual) / np.abs(actual))))
+    for sample in samples:
+        abs_err = max(abs_err, float(np.max(np.abs(spline(evap_grid, cond_grid) - sample))))
+
+    tx, ty, coeffs = spline.tck
+    kx, ky = spline.degrees
+    return {
+        'tck': [tx.tolist(), ty.tolist(), coeffs.tolist(), int(kx), int(ky)],
+        'evap_T_range': [float(evap_grid[0]), float(evap_grid[-1])],
+        'cond_T_range': [float(cond_grid[0]), float(cond_grid[-1])],
+        'Q_cond_range': [float(q_grid[0]), float(q_grid[-1])],
+        'error_bound': {'COP_abs': abs_err, 'COP_rel': rel_err},
+        'n_samples': int(len(q_grid) * (evap_grid.size * cond_grid.size + evap_mid.size * cond_mid.size)),
+    }
+
+
+def train(fluids=DEFAULT_FLUIDS, path=SURROGATE_PATH, **grids):
+    """Train every fluid and write the versioned surrogate file."""
+    import CoolProp
+    import tespy
+
+    surrogates = {}
+    for fluid in fluids:
+        print(f"[INFO] Training heat pump surrogate for {fluid}")
+        try:
+            surrogates[fluid] = train_fluid(fluid, **grids)
+        except Exception as e:
+            print(f"[WARNING] Skipping {fluid}: {e}")
+
+    document = {
+        'version': SURROGATE_VERSION,
+        'model': 'heatpump_app.build_heatpump_network',
+        'tespy': tespy.__version__,
+        'CoolProp': CoolProp.__version__,
+        'fluids': surrogates,
+    }
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(document, f)
+    os.replace(tmp_path, path)
+    return document
+
+
+def load_surrogates(path=SURROGATE_PATH):
+    """Return {fluid: surrogate} from the file, or {} if it is missing or from another version."""
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+
+    with _loaded_lock:
+        cached = _loaded.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+    try:
+        with open(path) as f:
+            document = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[WARNING] Could not read surrogate file {path}: {e}")
+        return {}
+
+    if document.get('version') != SURROGATE_VERSION:
+        print(f"[WARNING] Ignoring surrogate file {path}: version {document.get('version')} != {SURROGATE_VERSION}")
+        surrogates = {}
+    else:
+        surrogates = {}
+        for fluid, entry in document['fluids'].items():
+            tx, ty, coeffs, kx, ky = entry['tck']
+            entry = dict(entry, tck=(np.asarray(tx), np.asarray(ty), np.asarray(coeffs), kx, ky))
+            surrogates[fluid] = entry
+
+    with _loaded_lock:
+        _loaded[path] = (mtime, surrogates)
+    return surrogates
+
+
+def predict(fluid, evap_T, cond_T, Q_cond, path=SURROGATE_PATH):
+    """Surrogate result for one point, or None if the fluid or point is outside the trained region."""
+    entry = load_surrogates(path).get(fluid)
+    if entry is None:
+        return None
+
+    in_region = (
+        entry['evap_T_range'][0] <= evap_T <= entry['evap_T_range'][1]
+        and entry['cond_T_range'][0] <= cond_T <= entry['cond_T_range'][1]
+        and entry['Q_cond_range'][0] <= Q_cond <= entry['Q_cond_range'][1]
+    )
+    if not in_region:
+        return None
+
+    cop = float(bisplev(evap_T, cond_T, entry['tck']))
+    return {
+        'COP': cop,
+        'cp_power_kW': Q_cond / cop,
+        'condenser_Q_kW': Q_cond,
+        'error_bound': entry['error_bound'],
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train the heat pump COP surrogate.')
+    parser.add_argument('--fluids', nargs='+', default=DEFAULT_FLUIDS)
+    parser.add_argument('--output', default=SURROGATE_PATH)
+    args = parser.parse_args()
+
+    result = train(args.fluids, args.output)
+    for name, entry in result['fluids'].items():
+        print(f"{name}: COP error <= {entry['error_bound']['COP_abs']:.2e} "
+              f"({entry['error_bound']['COP_rel']:.2%}) over {entry['n_samples']} samples")
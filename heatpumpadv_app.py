@@ -1,269 +1,657 @@
 from flask import Blueprint, request, jsonify
-import os, uuid
-
-from flask import Response
-import numpy as np
+import hashlib
 import json
+import math
+import os
+import shutil
+import tempfile
+import time
+
+from fluid_properties import PROPERTY_BACKEND, saturation_enthalpy, saturation_pressure, tespy_fluid
+from tespy_results import columnar_results, parse_fields, project_results, results_response
+
+heatpumpadv_bp = Blueprint('heatpumpadv', __name__)
+
+WORKING_FLUID = "NH3"
+
+# Tabular NH3 is accurate but stalls the drum offdesign solve, so NH3 stays on HEOS
+WORKING_FLUID_BACKEND = "HEOS"
+
+# Design point of the two-stage NH3 heat pump
+DESIGN_DEFAULTS = {
+    "Q": 230e3,        # consumer heat demand in W
+    "T_amb": 15.0,     # ambient source temperature in °C
+    "T_supply": 90.0,  # consumer supply temperature in °C
+}
+
+# Temperature drop of the ambient source water across the evaporator system, K
+AMBIENT_COOLING = 6.0
+
+# Upper bound on offdesign points per request
+MAX_SWEEP_POINTS = 500
+
+# Largest change per solve when walking from the last converged point to the next one;
+# bigger jumps (e.g. T_amb 15 -> 10 °C) are split into intermediate continuation solves
+CONTINUATION_STEP = {
+    "Q": 20e3,        # W
+    "T_amb": 1.0,     # K
+    "T_supply": 2.0,  # K
+}
+
+# Solved designs, one directory per design: <key>/design.json (nw.save output) + meta.json.
+# Bump DESIGN_STORE_VERSION whenever the network topology or its fixed specs change.
+DESIGN_STORE_VERSION = 1
+DESIGN_STORE_DIR = os.getenv("DESIGN_STORE_DIR", os.path.join(tempfile.gettempdir(), "heatpumpadv_designs"))
+DESIGN_STORE_MAX_BYTES = int(float(os.getenv("DESIGN_STORE_MAX_MB", 200)) * 1024 ** 2)
+DESIGN_STORE_MAX_AGE = float(os.getenv("DESIGN_STORE_MAX_AGE", 30 * 24 * 3600))  # seconds since last use
+
 
-def json_with_nan_fix(data):
-    def fix_nans(obj):
-        if isinstance(obj, dict):
-            return {k: fix_nans(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [fix_nans(v) for v in obj]
-        elif isinstance(obj, float):
-            if np.isnan(obj) or np.isinf(obj):
-                return None
-            else:
-                return obj
-        return obj
-
-    clean_data = fix_nans(data)
-    return Response(
-        json.dumps(clean_data),
-        content_type="application/json"
+def build_design(design=DESIGN_DEFAULTS):
+    """Build the NH3 heat pump in four staged design solves and set its offdesign specs.
+
+    Returns a dict with the network and the components/connections needed for
+    offdesign runs.
+    """
+    from tespy.networks import Network
+    working_fluid = WORKING_FLUID
+    T_amb = design["T_amb"]
+
+    nw = Network(
+        T_unit="C", p_unit="bar", h_unit="kJ / kg", m_unit="kg / s", iterinfo=False
     )
 
+    from tespy.components import Condenser
+    from tespy.components import CycleCloser
+    from tespy.components import SimpleHeatExchanger
+    from tespy.components import Pump
+    from tespy.components import Sink
+    from tespy.components import Source
 
+    # sources & sinks
+    c_in = Source("refrigerant in")
+    cons_closer = CycleCloser("consumer cycle closer")
+    va = Sink("valve")
 
-heatpumpadv_bp = Blueprint('heatpumpadv', __name__)
-@heatpumpadv_bp.route('/parametric-cop', methods=['GET'])
-def parametric_cop():
-    try:
-        from tespy.networks import Network
-        working_fluid = "NH3"
+    # consumer system
+    cd = Condenser("condenser")
+    rp = Pump("recirculation pump")
+    cons = SimpleHeatExchanger("consumer")
 
-        nw = Network(
-            T_unit="C", p_unit="bar", h_unit="kJ / kg", m_unit="kg / s"
-        )
-
-        
-        from tespy.components import Condenser
-        from tespy.components import CycleCloser
-        from tespy.components import SimpleHeatExchanger
-        from tespy.components import Pump
-        from tespy.components import Sink
-        from tespy.components import Source
-
-        # sources & sinks
-        c_in = Source("refrigerant in")
-        cons_closer = CycleCloser("consumer cycle closer")
-        va = Sink("valve")
-
-        # consumer system
-        cd = Condenser("condenser")
-        rp = Pump("recirculation pump")
-        cons = SimpleHeatExchanger("consumer")
-
-        
-        from tespy.connections import Connection
-
-        c0 = Connection(c_in, "out1", cd, "in1", label="0")
-        c1 = Connection(cd, "out1", va, "in1", label="1")
-
-        c20 = Connection(cons_closer, "out1", rp, "in1", label="20")
-        c21 = Connection(rp, "out1", cd, "in2", label="21")
-        c22 = Connection(cd, "out2", cons, "in1", label="22")
-        c23 = Connection(cons, "out1", cons_closer, "in1", label="23")
-
-        nw.add_conns(c0, c1, c20, c21, c22, c23)
-
-        
-        cd.set_attr(pr1=0.99, pr2=0.99)
-        rp.set_attr(eta_s=0.75)
-        cons.set_attr(pr=0.99)
-
-        
-        from CoolProp.CoolProp import PropsSI as PSI
-        p_cond = PSI("P", "Q", 1, "T", 273.15 + 95, working_fluid) / 1e5
-        c0.set_attr(T=170, p=p_cond, fluid={working_fluid: 1})
-        c20.set_attr(T=60, p=2, fluid={"water": 1})
-        c22.set_attr(T=90)
-
-        # key design paramter
-        cons.set_attr(Q=-230e3)
-
-        
-        nw.solve("design")
-        #nw.print_results()
-
-        
-        from tespy.components import Valve, Drum, HeatExchanger
-
-        # ambient heat source
-        amb_in = Source("source ambient")
-        amb_out = Sink("sink ambient")
-
-        # evaporator system
-        va = Valve("valve")
-        dr = Drum("drum")
-        ev = HeatExchanger("evaporator")
-        su = HeatExchanger("superheater")
-
-        # virtual source
-        cp1 = Sink("compressor 1")
-
-        
-        nw.del_conns(c1)
-
-        # evaporator system
-        c1 = Connection(cd, "out1", va, "in1", label="1")
-        c2 = Connection(va, "out1", dr, "in1", label="2")
-        c3 = Connection(dr, "out1", ev, "in2", label="3")
-        c4 = Connection(ev, "out2", dr, "in2", label="4")
-        c5 = Connection(dr, "out2", su, "in2", label="5")
-        c6 = Connection(su, "out2", cp1, "in1", label="6")
-
-        nw.add_conns(c1, c2, c3, c4, c5, c6)
-
-        c17 = Connection(amb_in, "out1", su, "in1", label="17")
-        c18 = Connection(su, "out1", ev, "in1", label="18")
-        c19 = Connection(ev, "out1", amb_out, "in1", label="19")
-
-        nw.add_conns(c17, c18, c19)
-
-        
-        ev.set_attr(pr1=0.99)
-        su.set_attr(pr1=0.99, pr2=0.99)
-
-        
-        # evaporator system cold side
-        c4.set_attr(x=0.9, T=5)
-
-        h_sat = PSI("H", "Q", 1, "T", 273.15 + 15, working_fluid) / 1e3
-        c6.set_attr(h=h_sat)
-
-        # evaporator system hot side
-        c17.set_attr(T=15, fluid={"water": 1})
-        c19.set_attr(T=9, p=1.013)
-        nw.solve("design")
-        #nw.print_results()
-        
-        from tespy.components import Compressor, Splitter, Merge
-
-        cp1 = Compressor("compressor 1")
-        cp2 = Compressor("compressor 2")
-
-        ic = HeatExchanger("intermittent cooling")
-        hsp = Pump("heat source pump")
-
-        sp = Splitter("splitter")
-        me = Merge("merge")
-        cv = Valve("control valve")
-
-        hs = Source("ambient intake")
-        cc = CycleCloser("heat pump cycle closer")
-
-        
-        nw.del_conns(c0, c6, c17)
-
-        c6 = Connection(su, "out2", cp1, "in1", label="6")
-        c7 = Connection(cp1, "out1", ic, "in1", label="7")
-        c8 = Connection(ic, "out1", cp2, "in1", label="8")
-        c9 = Connection(cp2, "out1", cc, "in1", label="9")
-        c0 = Connection(cc, "out1", cd, "in1", label="0")
-
-        c11 = Connection(hs, "out1", hsp, "in1", label="11")
-        c12 = Connection(hsp, "out1", sp, "in1", label="12")
-        c13 = Connection(sp, "out1", ic, "in2", label="13")
-        c14 = Connection(ic, "out2", me, "in1", label="14")
-        c15 = Connection(sp, "out2", cv, "in1", label="15")
-        c16 = Connection(cv, "out1", me, "in2", label="16")
-        c17 = Connection(me, "out1", su, "in1", label="17")
-
-        nw.add_conns(c6, c7, c8, c9, c0, c11, c12, c13, c14, c15, c16, c17)
-
-        
-        pr = (c1.p.val / c5.p.val) ** 0.5
-        cp1.set_attr(pr=pr)
-        ic.set_attr(pr1=0.99, pr2=0.98)
-        hsp.set_attr(eta_s=0.75)
-
-        
-        c0.set_attr(p=p_cond, fluid={working_fluid: 1})
-
-        c6.set_attr(h=c5.h.val + 10)
-        c8.set_attr(h=c5.h.val + 10)
-
-        c7.set_attr(h=c5.h.val * 1.2)
-        c9.set_attr(h=c5.h.val * 1.2)
-
-        c11.set_attr(p=1.013, T=15, fluid={"water": 1})
-        c14.set_attr(T=30)
-        
-
-        nw.solve("design")
-
-        c0.set_attr(p=None)
-        cd.set_attr(ttd_u=5)
-        
-        c4.set_attr(T=None)
-        ev.set_attr(ttd_l=5)
-        
-        c6.set_attr(h=None)
-        su.set_attr(ttd_u=5)
-        
-        c7.set_attr(h=None)
-        cp1.set_attr(eta_s=0.8)
-        
-        c9.set_attr(h=None)
-        cp2.set_attr(eta_s=0.8)
-        
-        c8.set_attr(h=None, Td_bp=4)
-        nw.solve("design")
-
-        cp1.set_attr(design=["eta_s"], offdesign=["eta_s_char"])
-        cp2.set_attr(design=["eta_s"], offdesign=["eta_s_char"])
-        rp.set_attr(design=["eta_s"], offdesign=["eta_s_char"])
-        hsp.set_attr(design=["eta_s"], offdesign=["eta_s_char"])
-        
-        cons.set_attr(design=["pr"], offdesign=["zeta"])
-        
-        cd.set_attr(
-            design=["pr2", "ttd_u"], offdesign=["zeta2", "kA_char"]
-        )
-        
-        from tespy.tools.characteristics import CharLine
-        from tespy.tools.characteristics import load_default_char as ldc
-        
-        kA_char1 = ldc("heat exchanger", "kA_char1", "DEFAULT", CharLine)
-        kA_char2 = ldc("heat exchanger", "kA_char2", "EVAPORATING FLUID", CharLine)
-        ev.set_attr(
-            kA_char1=kA_char1, kA_char2=kA_char2,
-            design=["pr1", "ttd_l"], offdesign=["zeta1", "kA_char"]
-        )
-        
-        su.set_attr(
-            design=["pr1", "pr2", "ttd_u"], offdesign=["zeta1", "zeta2", "kA_char"]
-        )
-        
-        ic.set_attr(
-            design=["pr1", "pr2"], offdesign=["zeta1", "zeta2", "kA_char"]
-        )
-        c14.set_attr(design=["T"])
-
-        # Design point
-        design_path = f"/tmp/design_{uuid.uuid4().hex}.json"
-        nw.save(design_path)
-        # Offdesign
-        nw.solve("offdesign", design_path=design_path)
-        
-        # Compute final COP
-        q_out = cons.Q.val
-        w_in = cp1.P.val + cp2.P.val + rp.P.val + hsp.P.val
-        cop = abs(q_out) / w_in if w_in != 0 else None
+    from tespy.connections import Connection
+
+    c0 = Connection(c_in, "out1", cd, "in1", label="0")
+    c1 = Connection(cd, "out1", va, "in1", label="1")
+
+    c20 = Connection(cons_closer, "out1", rp, "in1", label="20")
+    c21 = Connection(rp, "out1", cd, "in2", label="21")
+    c22 = Connection(cd, "out2", cons, "in1", label="22")
+    c23 = Connection(cons, "out1", cons_closer, "in1", label="23")
+
+    nw.add_conns(c0, c1, c20, c21, c22, c23)
+
+    cd.set_attr(pr1=0.99, pr2=0.99)
+    rp.set_attr(eta_s=0.75)
+    cons.set_attr(pr=0.99)
+
+    p_cond = saturation_pressure(working_fluid, 273.15 + design["T_supply"] + 5, backend=WORKING_FLUID_BACKEND) / 1e5
+    c0.set_attr(T=170, p=p_cond, fluid={tespy_fluid(working_fluid, WORKING_FLUID_BACKEND): 1})
+    c20.set_attr(T=60, p=2, fluid={tespy_fluid("water"): 1})
+    c22.set_attr(T=design["T_supply"])
+
+    # key design paramter
+    cons.set_attr(Q=-design["Q"])
+
+    nw.solve("design", print_results=False)
+
+    from tespy.components import Valve, Drum, HeatExchanger
+
+    # ambient heat source
+    amb_in = Source("source ambient")
+    amb_out = Sink("sink ambient")
+
+    # evaporator system
+    va = Valve("valve")
+    dr = Drum("drum")
+    ev = HeatExchanger("evaporator")
+    su = HeatExchanger("superheater")
+
+    # virtual source
+    cp1 = Sink("compressor 1")
+
+    nw.del_conns(c1)
+
+    # evaporator system
+    c1 = Connection(cd, "out1", va, "in1", label="1")
+    c2 = Connection(va, "out1", dr, "in1", label="2")
+    c3 = Connection(dr, "out1", ev, "in2", label="3")
+    c4 = Connection(ev, "out2", dr, "in2", label="4")
+    c5 = Connection(dr, "out2", su, "in2", label="5")
+    c6 = Connection(su, "out2", cp1, "in1", label="6")
+
+    nw.add_conns(c1, c2, c3, c4, c5, c6)
+
+    c17 = Connection(amb_in, "out1", su, "in1", label="17")
+    c18 = Connection(su, "out1", ev, "in1", label="18")
+    c19 = Connection(ev, "out1", amb_out, "in1", label="19")
+
+    nw.add_conns(c17, c18, c19)
+
+    ev.set_attr(pr1=0.99)
+    su.set_attr(pr1=0.99, pr2=0.99)
+
+    # evaporator system cold side
+    c4.set_attr(x=0.9, T=T_amb - 10)
+
+    h_sat = saturation_enthalpy(working_fluid, 273.15 + T_amb, backend=WORKING_FLUID_BACKEND) / 1e3
+    c6.set_attr(h=h_sat)
+
+    # evaporator system hot side
+    c17.set_attr(T=T_amb, fluid={tespy_fluid("water"): 1})
+    c19.set_attr(T=T_amb - AMBIENT_COOLING, p=1.013)
+    nw.solve("design", print_results=False)
+
+    from tespy.components import Compressor, Splitter, Merge
+
+    cp1 = Compressor("compressor 1")
+    cp2 = Compressor("compressor 2")
+
+    ic = HeatExchanger("intermittent cooling")
+    hsp = Pump("heat source pump")
+
+    sp = Splitter("splitter")
+    me = Merge("merge")
+    cv = Valve("control valve")
+
+    hs = Source("ambient intake")
+    cc = CycleCloser("heat pump cycle closer")
+
+    nw.del_conns(c0, c6, c17)
 
-        os.remove(design_path)
+    c6 = Connection(su, "out2", cp1, "in1", label="6")
+    c7 = Connection(cp1, "out1", ic, "in1", label="7")
+    c8 = Connection(ic, "out1", cp2, "in1", label="8")
+    c9 = Connection(cp2, "out1", cc, "in1", label="9")
+    c0 = Connection(cc, "out1", cd, "in1", label="0")
 
-        results = {}
+    c11 = Connection(hs, "out1", hsp, "in1", label="11")
+    c12 = Connection(hsp, "out1", sp, "in1", label="12")
+    c13 = Connection(sp, "out1", ic, "in2", label="13")
+    c14 = Connection(ic, "out2", me, "in1", label="14")
+    c15 = Connection(sp, "out2", cv, "in1", label="15")
+    c16 = Connection(cv, "out1", me, "in2", label="16")
+    c17 = Connection(me, "out1", su, "in1", label="17")
 
-        for key, df in nw.results.items():
-            results[key] = df.to_dict(orient="index")
+    nw.add_conns(c6, c7, c8, c9, c0, c11, c12, c13, c14, c15, c16, c17)
 
+    pr = (c1.p.val / c5.p.val) ** 0.5
+    cp1.set_attr(pr=pr)
+    ic.set_attr(pr1=0.99, pr2=0.98)
+    hsp.set_attr(eta_s=0.75)
 
-        return json_with_nan_fix({ 
-            "results": {k: v.to_dict() for k, v in nw.results.items()} 
-        })
+    c0.set_attr(p=p_cond, fluid={tespy_fluid(working_fluid, WORKING_FLUID_BACKEND): 1})
+
+    c6.set_attr(h=c5.h.val + 10)
+    c8.set_attr(h=c5.h.val + 10)
+
+    c7.set_attr(h=c5.h.val * 1.2)
+    c9.set_attr(h=c5.h.val * 1.2)
+
+    c11.set_attr(p=1.013, T=T_amb, fluid={tespy_fluid("water"): 1})
+    c14.set_attr(T=30)
+
+    nw.solve("design", print_results=False)
+
+    c0.set_attr(p=None)
+    cd.set_attr(ttd_u=5)
+
+    c4.set_attr(T=None)
+    ev.set_attr(ttd_l=5)
+
+    c6.set_attr(h=None)
+    su.set_attr(ttd_u=5)
+
+    c7.set_attr(h=None)
+    cp1.set_attr(eta_s=0.8)
+
+    c9.set_attr(h=None)
+    cp2.set_attr(eta_s=0.8)
+
+    c8.set_attr(h=None, Td_bp=4)
+    nw.solve("design", print_results=False)
+
+    cp1.set_attr(design=["eta_s"], offdesign=["eta_s_char"])
+    cp2.set_attr(design=["eta_s"], offdesign=["eta_s_char"])
+    rp.set_attr(design=["eta_s"], offdesign=["eta_s_char"])
+    hsp.set_attr(design=["eta_s"], offdesign=["eta_s_char"])
+
+    cons.set_attr(design=["pr"], offdesign=["zeta"])
+
+    cd.set_attr(
+        design=["pr2", "ttd_u"], offdesign=["zeta2", "kA_char"]
+    )
+
+    from tespy.tools.characteristics import CharLine
+    from tespy.tools.characteristics import load_default_char as ldc
+
+    kA_char1 = ldc("heat exchanger", "kA_char1", "DEFAULT", CharLine)
+    kA_char2 = ldc("heat exchanger", "kA_char2", "EVAPORATING FLUID", CharLine)
+    ev.set_attr(
+        kA_char1=kA_char1, kA_char2=kA_char2,
+        design=["pr1", "ttd_l"], offdesign=["zeta1", "kA_char"]
+    )
+
+    su.set_attr(
+        design=["pr1", "pr2", "ttd_u"], offdesign=["zeta1", "zeta2", "kA_char"]
+    )
+
+    ic.set_attr(
+        design=["pr1", "pr2"], offdesign=["zeta1", "zeta2", "kA_char"]
+    )
+    c14.set_attr(design=["T"])
+
+    return {
+        "network": nw, "design": dict(design), "cp1_pr": pr,
+        "cons": cons, "cp1": cp1, "cp2": cp2, "rp": rp, "hsp": hsp,
+        "c11": c11, "c19": c19, "c22": c22,
+    }
+
+
+def build_offdesign_network(design, cp1_pr):
+    """Build the final NH3 heat pump topology directly, ready for offdesign runs.
+
+    Mirrors the network left behind by build_design(), but skips the staged design
+    solves: the design state comes from a stored nw.save() file instead. `cp1_pr`
+    is the compressor 1 pressure ratio fixed during the third design stage.
+    """
+    from tespy.networks import Network
+    from tespy.components import (
+        Compressor, Condenser, CycleCloser, Drum, HeatExchanger, Merge, Pump,
+        SimpleHeatExchanger, Sink, Source, Splitter, Valve
+    )
+    from tespy.connections import Connection
+    from tespy.tools.characteristics import CharLine
+    from tespy.tools.characteristics import load_default_char as ldc
+
+    working_fluid = WORKING_FLUID
+    T_amb = design["T_amb"]
+
+    nw = Network(
+        T_unit="C", p_unit="bar", h_unit="kJ / kg", m_unit="kg / s", iterinfo=False
+    )
+
+    # consumer system
+    cons_closer = CycleCloser("consumer cycle closer")
+    cd = Condenser("condenser")
+    rp = Pump("recirculation pump")
+    cons = SimpleHeatExchanger("consumer")
+
+    # evaporator system
+    amb_out = Sink("sink ambient")
+    va = Valve("valve")
+    dr = Drum("drum")
+    ev = HeatExchanger("evaporator")
+    su = HeatExchanger("superheater")
+
+    # compression and heat source system
+    cp1 = Compressor("compressor 1")
+    cp2 = Compressor("compressor 2")
+    ic = HeatExchanger("intermittent cooling")
+    hsp = Pump("heat source pump")
+    sp = Splitter("splitter")
+    me = Merge("merge")
+    cv = Valve("control valve")
+    hs = Source("ambient intake")
+    cc = CycleCloser("heat pump cycle closer")
+
+    c0 = Connection(cc, "out1", cd, "in1", label="0")
+    c1 = Connection(cd, "out1", va, "in1", label="1")
+    c2 = Connection(va, "out1", dr, "in1", label="2")
+    c3 = Connection(dr, "out1", ev, "in2", label="3")
+    c4 = Connection(ev, "out2", dr, "in2", label="4")
+    c5 = Connection(dr, "out2", su, "in2", label="5")
+    c6 = Connection(su, "out2", cp1, "in1", label="6")
+    c7 = Connection(cp1, "out1", ic, "in1", label="7")
+    c8 = Connection(ic, "out1", cp2, "in1", label="8")
+    c9 = Connection(cp2, "out1", cc, "in1", label="9")
+
+    c11 = Connection(hs, "out1", hsp, "in1", label="11")
+    c12 = Connection(hsp, "out1", sp, "in1", label="12")
+    c13 = Connection(sp, "out1", ic, "in2", label="13")
+    c14 = Connection(ic, "out2", me, "in1", label="14")
+    c15 = Connection(sp, "out2", cv, "in1", label="15")
+    c16 = Connection(cv, "out1", me, "in2", label="16")
+    c17 = Connection(me, "out1", su, "in1", label="17")
+    c18 = Connection(su, "out1", ev, "in1", label="18")
+    c19 = Connection(ev, "out1", amb_out, "in1", label="19")
+
+    c20 = Connection(cons_closer, "out1", rp, "in1", label="20")
+    c21 = Connection(rp, "out1", cd, "in2", label="21")
+    c22 = Connection(cd, "out2", cons, "in1", label="22")
+    c23 = Connection(cons, "out1", cons_closer, "in1", label="23")
+
+    nw.add_conns(
+        c0, c1, c2, c3, c4, c5, c6, c7, c8, c9, c11, c12, c13, c14, c15, c16,
+        c17, c18, c19, c20, c21, c22, c23
+    )
+
+    # component specifications as left by the last design stage
+    cd.set_attr(pr1=0.99, pr2=0.99, ttd_u=5, design=["pr2", "ttd_u"], offdesign=["zeta2", "kA_char"])
+    rp.set_attr(eta_s=0.75, design=["eta_s"], offdesign=["eta_s_char"])
+    cons.set_attr(pr=0.99, Q=-design["Q"], design=["pr"], offdesign=["zeta"])
+
+    kA_char1 = ldc("heat exchanger", "kA_char1", "DEFAULT", CharLine)
+    kA_char2 = ldc("heat exchanger", "kA_char2", "EVAPORATING FLUID", CharLine)
+    ev.set_attr(
+        pr1=0.99, ttd_l=5, kA_char1=kA_char1, kA_char2=kA_char2,
+        design=["pr1", "ttd_l"], offdesign=["zeta1", "kA_char"]
+    )
+    su.set_attr(
+        pr1=0.99, pr2=0.99, ttd_u=5,
+        design=["pr1", "pr2", "ttd_u"], offdesign=["zeta1", "zeta2", "kA_char"]
+    )
+    cp1.set_attr(pr=cp1_pr, eta_s=0.8, design=["eta_s"], offdesign=["eta_s_char"])
+    cp2.set_attr(eta_s=0.8, design=["eta_s"], offdesign=["eta_s_char"])
+    ic.set_attr(
+        pr1=0.99, pr2=0.98,
+        design=["pr1", "pr2"], offdesign=["zeta1", "zeta2", "kA_char"]
+    )
+    hsp.set_attr(eta_s=0.75, design=["eta_s"], offdesign=["eta_s_char"])
+
+    # connection specifications as left by the last design stage
+    c0.set_attr(fluid={tespy_fluid(working_fluid, WORKING_FLUID_BACKEND): 1})
+    c4.set_attr(x=0.9)
+    c8.set_attr(Td_bp=4)
+    c11.set_attr(p=1.013, T=T_amb, fluid={tespy_fluid("water"): 1})
+    c14.set_attr(T=30, design=["T"])
+    c19.set_attr(T=T_amb - AMBIENT_COOLING, p=1.013)
+    c20.set_attr(T=60, p=2, fluid={tespy_fluid("water"): 1})
+    c22.set_attr(T=design["T_supply"])
+
+    return {
+        "network": nw, "design": dict(design), "cp1_pr": cp1_pr,
+        "cons": cons, "cp1": cp1, "cp2": cp2, "rp": rp, "hsp": hsp,
+        "c11": c11, "c19": c19, "c22": c22,
+    }
+
+
+def system_cop(model):
+    """Heat delivered to the consumer over the power of both compressors and both pumps."""
+    q_out = model["cons"].Q.val
+    w_in = model["cp1"].P.val + model["cp2"].P.val + model["rp"].P.val + model["hsp"].P.val
+    return abs(q_out) / w_in if w_in != 0 else None
+
+
+# Named KPIs computed server-side from a solved model, selectable with fields=
+KPIS = {
+    "COP": system_cop,
+    "compressor_power_W": lambda model: model["cp1"].P.val + model["cp2"].P.val,
+    "pump_power_W": lambda model: model["rp"].P.val + model["hsp"].P.val,
+    "heat_output_W": lambda model: abs(model["cons"].Q.val),
+    "partload": lambda model: abs(model["cons"].Q.val) / model["design"]["Q"],
+}
+
+
+def solve_offdesign(model, design_path, Q, T_amb, T_supply):
+    """Run one offdesign point, starting the solver from the previous converged state.
+
+    A network built from a stored design has no previous state yet, so its first
+    solve is initialised from the stored design file.
+    """
+    model["cons"].set_attr(Q=-Q)
+    model["c11"].set_attr(T=T_amb)
+    model["c19"].set_attr(T=T_amb - AMBIENT_COOLING)
+    model["c22"].set_attr(T=T_supply)
+    model["network"].solve(
+        "offdesign", design_path=design_path, init_path=model.pop("init_path", None),
+        print_results=False
+    )
+    return model["network"].converged
+
+
+def continuation_path(start, target):
+    """Points from `start` to `target`, both (T_supply, T_amb, Q), with the target included
+    and no step larger than CONTINUATION_STEP."""
+    steps = (CONTINUATION_STEP["T_supply"], CONTINUATION_STEP["T_amb"], CONTINUATION_STEP["Q"])
+    n = max(1, max(math.ceil(abs(b - a) / step - 1e-9) for a, b, step in zip(start, target, steps)))
+    return [tuple(a + (b - a) * k / n for a, b in zip(start, target)) for k in range(1, n + 1)]
+
+
+def design_key(design):
+    """Content address of a design: topology version, working fluid, property backend and rounded parameters."""
+    payload = {
+        "version": DESIGN_STORE_VERSION,
+        "fluid": WORKING_FLUID,
+        "backend": PROPERTY_BACKEND,
+        "design": {k: round(float(v), 6) for k, v in sorted(design.items())},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def evict_designs(keep=None):
+    """Drop stored designs unused for DESIGN_STORE_MAX_AGE, then the least recently used over the size cap.
+
+    `keep` is the directory of a design that is about to be used; it is never dropped.
+    """
+    entries = []
+    for name in os.listdir(DESIGN_STORE_DIR):
+        entry_dir = os.path.join(DESIGN_STORE_DIR, name)
+        meta_path = os.path.join(entry_dir, "meta.json")
+        try:
+            last_used = os.path.getmtime(meta_path)
+            size = sum(
+                os.path.getsize(os.path.join(root, f))
+                for root, _, files in os.walk(entry_dir) for f in files
+            )
+        except OSError:
+            continue
+        entries.append((last_used, size, entry_dir))
+
+    now = time.time()
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for last_used, size, entry_dir in entries:
+        if now - last_used <= DESIGN_STORE_MAX_AGE and total <= DESIGN_STORE_MAX_BYTES:
+            break
+        if entry_dir == keep:
+            continue
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total -= size
+
+
+def get_design_model(design):
+    """Model and design file for a design, solving and storing the design only on first use."""
+    entry_dir = os.path.join(DESIGN_STORE_DIR, design_key(design))
+    design_path = os.path.join(entry_dir, "design.json")
+    meta_path = os.path.join(entry_dir, "meta.json")
+
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        # Mark as recently used for eviction
+        os.utime(meta_path)
+        model = build_offdesign_network(design, meta["cp1_pr"])
+        model["init_path"] = design_path
+        return model, design_path
+    except (OSError, ValueError, KeyError):
+        pass
+
+    print(f"[INFO] Solving new NH3 heat pump design {design}")
+    model = build_design(design)
+
+    os.makedirs(DESIGN_STORE_DIR, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=DESIGN_STORE_DIR, prefix=".tmp-")
+    model["network"].save(os.path.join(tmp_dir, "design.json"))
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump({"design": model["design"], "cp1_pr": model["cp1_pr"]}, f)
+    try:
+        # Atomic publish; if another worker stored the same design first, keep theirs
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.exists(design_path):
+            raise
+
+    evict_designs(keep=entry_dir)
+    return model, design_path
+
+
+def outward(axis, start):
+    """Axis values sorted so the walk starts at the end nearest `start`."""
+    values = sorted(axis)
+    return values if abs(values[0] - start) <= abs(values[-1] - start) else values[::-1]
+
+
+def sweep_order(t_supply_axis, t_amb_axis, q_axis, design=DESIGN_DEFAULTS):
+    """Grid points in serpentine order, so each point differs from the previous one in one axis.
+
+    Each axis is walked from the end nearest the design point, where the sweep starts.
+    """
+    t_supply_axis = outward(t_supply_axis, design["T_supply"])
+    t_amb_axis = outward(t_amb_axis, design["T_amb"])
+    q_axis = outward(q_axis, design["Q"])
+    points = []
+    for i, T_supply in enumerate(t_supply_axis):
+        t_amb_values = t_amb_axis if i % 2 == 0 else t_amb_axis[::-1]
+        for j, T_amb in enumerate(t_amb_values):
+            q_values = q_axis if (i * len(t_amb_axis) + j) % 2 == 0 else q_axis[::-1]
+            points.extend((T_supply, T_amb, Q) for Q in q_values)
+    return points
+
+
+def sweep_axis(args, name, default):
+    """Comma-separated request parameter (or a JSON list/number from a job) as a list of floats."""
+    raw = args.get(name)
+    if raw is None:
+        return [default]
+    if isinstance(raw, (int, float)):
+        return [float(raw)]
+    if isinstance(raw, list):
+        return [float(v) for v in raw]
+    return [float(v) for v in raw.split(",") if v.strip()]
+
+
+def parse_cop_args(args):
+    """Validate parametric-cop parameters; returns (sweep, design, points, fields) or raises ValueError.
+
+    `fields` is (kpi names, tables) from parse_fields, with tables None for all of them.
+    """
+    sweep = any(name in args for name in ("Q", "T_amb", "T_supply"))
+    design = {
+        "Q": float(args.get("design_Q", DESIGN_DEFAULTS["Q"])),
+        "T_amb": float(args.get("design_T_amb", DESIGN_DEFAULTS["T_amb"])),
+        "T_supply": float(args.get("design_T_supply", DESIGN_DEFAULTS["T_supply"])),
+    }
+    q_axis = sweep_axis(args, "Q", design["Q"])
+    t_amb_axis = sweep_axis(args, "T_amb", design["T_amb"])
+    t_supply_axis = sweep_axis(args, "T_supply", design["T_supply"])
+    if len(q_axis) * len(t_amb_axis) * len(t_supply_axis) > MAX_SWEEP_POINTS:
+        raise ValueError(f"At most {MAX_SWEEP_POINTS} points per sweep.")
+    points = sweep_order(t_supply_axis, t_amb_axis, q_axis, design)
+    if len(points) > MAX_SWEEP_POINTS:
+        raise ValueError(f"At most {MAX_SWEEP_POINTS} points per sweep.")
+
+    fields = args.get("fields")
+    if fields is None:
+        fields = (["COP", "partload"], None) if sweep else (list(KPIS), None)
+    else:
+        fields = parse_fields(fields, KPIS)
+        if sweep and fields[1]:
+            raise ValueError("Only KPIs can be selected in a sweep: " + ", ".join(KPIS))
+    return sweep, design, points, fields
+
+
+def run_parametric_cop(args, progress=None):
+    """Offdesign COP of the NH3 heat pump.
+
+    Without sweep parameters, returns the full network results at the design point.
+    With any of `Q` (consumer heat demand, W), `T_amb` (ambient source temperature, °C)
+    or `T_supply` (consumer supply temperature, °C) given as comma-separated lists,
+    returns a COP/partload table over the grid of points. The grid is walked outward from
+    the design point, each point warm-started from the last converged one through
+    intermediate solves no further apart than CONTINUATION_STEP. The design point
+    (`design_Q`, `design_T_amb`, `design_T_supply`) is solved once and kept in the
+    design store for later requests.
+
+    `fields` selects what is returned: KPI names from KPIS and, for a single point,
+    results tables or columns (`Compressor`, `Connection.T,p`). Only the selected
+    tables are converted and serialised.
+
+    `args` holds the request parameters; `progress`, if given, is called with keyword
+    updates (stage, point, points) as the run advances.
+    """
+    report = progress or (lambda **info: None)
+    sweep, design, points, (kpis, tables) = parse_cop_args(args)
+
+    # Design point, from the store if it was solved before
+    report(stage="design")
+    model, design_path = get_design_model(design)
+    nw = model["network"]
+
+    if not sweep:
+        # Offdesign
+        report(stage="offdesign", point=0, points=1)
+        converged = solve_offdesign(model, design_path, design["Q"], design["T_amb"], design["T_supply"])
+        payload = {
+            "status": "success",
+            "design": design,
+            "converged": converged,
+            "kpis": {name: KPIS[name](model) if converged else None for name in kpis},
+        }
+        if tables is None:
+            payload["results"] = columnar_results(nw.results)
+        elif tables:
+            payload["results"] = project_results(nw.results, tables)
+        return payload
+
+    design_point = (design["T_supply"], design["T_amb"], design["Q"])
+    last_converged = design_point
+    table = {"Q": [], "T_amb": [], "T_supply": [], "converged": [], **{name: [] for name in kpis}}
+    for i, (T_supply, T_amb, Q) in enumerate(points):
+        report(stage="offdesign", point=i, points=len(points))
+        broken = False
+        try:
+            # Walk from the last converged point in small steps, the last step is the point itself.
+            # An intermediate step that stops short of convergence still moves the start closer,
+            # so only the point itself has to converge.
+            for step_T_supply, step_T_amb, step_Q in continuation_path(last_converged, (T_supply, T_amb, Q)):
+                converged = solve_offdesign(model, design_path, step_Q, step_T_amb, step_T_supply)
+        except Exception as e:
+            print(f"[WARNING] Offdesign failed at Q={Q}, T_amb={T_amb}, T_supply={T_supply}: {e}")
+            converged = False
+            broken = True
+
+        table["Q"].append(Q)
+        table["T_amb"].append(T_amb)
+        table["T_supply"].append(T_supply)
+        table["converged"].append(converged)
+        for name in kpis:
+            table[name].append(KPIS[name](model) if converged else None)
+
+        if converged:
+            last_converged = (T_supply, T_amb, Q)
+        elif broken:
+            # An aborted solve leaves the network unusable, so start over from the stored design
+            model, design_path = get_design_model(design)
+            nw = model["network"]
+            last_converged = design_point
+        else:
+            # Get back to a sane state before warm-starting the next point
+            solve_offdesign(model, design_path, design["Q"], design["T_amb"], design["T_supply"])
+            last_converged = design_point
+
+    return {"status": "success", "design": design, "table": table}
+
+
+@heatpumpadv_bp.route('/parametric-cop', methods=['GET'])
+def parametric_cop():
+    """Offdesign COP of the NH3 heat pump, see run_parametric_cop for the parameters."""
+    try:
+        parse_cop_args(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        return results_response(run_parametric_cop(request.args))
 
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)})
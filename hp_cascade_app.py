@@ -1,249 +1,279 @@
+from flask import Blueprint, request, jsonify
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.util import Finalize
+from typing import List
+
 import numpy as np
 from tespy.networks import Network
 from tespy.components import (
-    Compressor, Condenser, HeatExchangerSimple, Valve, 
-    HeatExchanger, Merge, Splitter, Sink, Source
+    Compressor, Valve, CycleCloser, HeatExchanger, Sink, Source
 )
+try:
+    from tespy.components import HeatExchangerSimple
+except ImportError:  # renamed in TESPy 0.7
+    from tespy.components import SimpleHeatExchanger as HeatExchangerSimple
 from tespy.connections import Connection
-from CoolProp.CoolProp import PropsSI
+from fluid_properties import PROPERTY_BACKEND, saturation_pressure, tespy_fluid
+import jobs_app
 import pandas as pd
+from pydantic import BaseModel, ValidationError, model_validator
+from result_cache import cache_from_env
+from tespy_results import parse_fields, project_results, results_response
+
+cascade_bp = Blueprint('cascade', __name__)
+
+# Worker processes for CascadeHeatPumpSystem.sweep
+SWEEP_WORKERS = int(os.getenv('CASCADE_SWEEP_WORKERS', os.cpu_count() or 1))
+
+# The system built once per sweep worker process
+_sweep_system = None
+_sweep_builder = None
+
+# Process pool for cascade optimisation batches, created on first use
+_optimise_executor = None
+_optimise_executor_lock = threading.Lock()
+
+# Memoised candidate evaluations keyed by the full candidate spec and the performance accounting version
+optimise_cache = cache_from_env('cascade-optimise')
+PERFORMANCE_VERSION = 3
+
+# Upper bounds per /optimise request
+MAX_OPTIMISE_GRID_POINTS = 50
+MAX_OPTIMISE_PAIRS = 16
+MAX_OPTIMISE_BATCHES = 20
+
+# Compiled systems kept per process, least recently used evicted first
+MAX_COMPILED_SYSTEMS = int(os.getenv('CASCADE_CACHE_SIZE', 8))
+
+# { topology_key: system } in LRU order; a system is removed while in use
+_compiled_systems = OrderedDict()
+_compiled_systems_lock = threading.Lock()
 
 
 class HeatPump:
     """Single heat pump unit with configurable refrigerant"""
     
-    def __init__(self, name, refrigerant, network):
+    def __init__(self, name, refrigerant, network, components):
         self.name = name
         self.refrigerant = refrigerant
         self.network = network
-        self.components = {}
+        # Built by compile_system; TESPy picks components up through their connections
+        self.components = components
         self.connections = []
-        
-        # Create components
-        self.components['compressor'] = Compressor(f'{name}_comp')
-        self.components['condenser'] = Condenser(f'{name}_cond')
-        self.components['valve'] = Valve(f'{name}_valve')
-        self.components['evaporator'] = HeatExchangerSimple(f'{name}_evap')
-        
-        # Add to network
-        for comp in self.components.values():
-            network.add_comps(comp)
-    
-    def connect_cycle(self):
-        """Connect components in basic cycle"""
-        # Refrigerant cycle connections
-        c1 = Connection(self.components['evaporator'], 'out1',
-                       self.components['compressor'], 'in1',
-                       label=f'{self.name}_c1')
-        c2 = Connection(self.components['compressor'], 'out1',
-                       self.components['condenser'], 'in1',
-                       label=f'{self.name}_c2')
-        c3 = Connection(self.components['condenser'], 'out1',
-                       self.components['valve'], 'in1',
-                       label=f'{self.name}_c3')
-        c4 = Connection(self.components['valve'], 'out1',
-                       self.components['evaporator'], 'in1',
-                       label=f'{self.name}_c4')
-        
-        self.connections = [c1, c2, c3, c4]
-        self.network.add_conns(*self.connections)
-        
-        # Set refrigerant
-        for conn in self.connections:
-            conn.set_attr(fluid={self.refrigerant: 1})
-        
-        return c1, c2, c3, c4
+        # Refrigerant connections by role: suction, discharge, liquid, subcooled, expansion
+        self.roles = {}
 
 
 class CascadeHeatPumpSystem:
     """Cascade heat pump system with flexible configuration"""
+
+    FLUIDS = ['water', 'propane', 'isobutane']
     
     def __init__(self):
-        self.network = Network(fluids=['water', 'propane', 'isobutane'])
-        self.network.set_attr(p_unit='bar', T_unit='C', h_unit='kJ/kg')
+        self.network = Network(fluids=self.FLUIDS)
+        self.network.set_attr(p_unit='bar', T_unit='C', h_unit='kJ / kg')
         self.heat_pumps = {}
         self.cascade_hx = None
         self.subcoolers = {}
-        
-    def add_heat_pump(self, name, refrigerant):
-        """Add a heat pump to the system"""
-        hp = HeatPump(name, refrigerant, self.network)
-        self.heat_pumps[name] = hp
-        return hp
-    
-    def create_cascade(self, hp1_name, hp2_name, cascade_type='condenser-evaporator'):
-        """Create cascade connection between two heat pumps"""
-        hp1 = self.heat_pumps[hp1_name]
-        hp2 = self.heat_pumps[hp2_name]
-        
-        if cascade_type == 'condenser-evaporator':
-            # Replace separate condenser/evaporator with cascade HX
-            self.cascade_hx = HeatExchanger(f'cascade_hx_{hp1_name}_{hp2_name}')
-            self.network.add_comps(self.cascade_hx)
-            
-            # Remove old connections and components
-            self.network.del_comps(hp1.components['condenser'])
-            self.network.del_comps(hp2.components['evaporator'])
-            
-            # Connect cascade heat exchanger
-            # HP1 hot side (condenser)
-            c_cas1 = Connection(hp1.components['compressor'], 'out1',
-                               self.cascade_hx, 'in1',
-                               label=f'cas_{hp1_name}_hot_in')
-            c_cas2 = Connection(self.cascade_hx, 'out1',
-                               hp1.components['valve'], 'in1',
-                               label=f'cas_{hp1_name}_hot_out')
-            
-            # HP2 cold side (evaporator)
-            c_cas3 = Connection(hp2.components['valve'], 'out1',
-                               self.cascade_hx, 'in2',
-                               label=f'cas_{hp2_name}_cold_in')
-            c_cas4 = Connection(self.cascade_hx, 'out2',
-                               hp2.components['compressor'], 'in1',
-                               label=f'cas_{hp2_name}_cold_out')
-            
-            self.network.add_conns(c_cas1, c_cas2, c_cas3, c_cas4)
-            
-            # Set fluids
-            c_cas1.set_attr(fluid={hp1.refrigerant: 1})
-            c_cas2.set_attr(fluid={hp1.refrigerant: 1})
-            c_cas3.set_attr(fluid={hp2.refrigerant: 1})
-            c_cas4.set_attr(fluid={hp2.refrigerant: 1})
-            
-            return self.cascade_hx
-    
-    def add_subcooler(self, hp_name, subcooler_fluid='isobutane'):
-        """Add subcooler to a heat pump"""
-        hp = self.heat_pumps[hp_name]
-        
-        # Create subcooler heat exchanger
-        subcooler = HeatExchanger(f'{hp_name}_subcooler')
-        self.network.add_comps(subcooler)
-        self.subcoolers[hp_name] = subcooler
-        
-        # Create subcooler cycle components
-        sc_comp = Compressor(f'{hp_name}_sc_comp')
-        sc_valve = Valve(f'{hp_name}_sc_valve')
-        sc_evap = HeatExchangerSimple(f'{hp_name}_sc_evap')
-        
-        self.network.add_comps(sc_comp, sc_valve, sc_evap)
-        
-        # Subcooler connections
-        # Main cycle side
-        # Intercept between condenser and valve
-        old_conn = None
-        for conn in self.network.conns.values():
-            if (conn.source.label == hp.components['condenser'].label and 
-                conn.target.label == hp.components['valve'].label):
-                old_conn = conn
-                break
-        
-        if old_conn:
-            self.network.del_conns(old_conn)
-        
-        c_sc1 = Connection(hp.components['condenser'], 'out1',
-                          subcooler, 'in1',
-                          label=f'{hp_name}_to_subcooler')
-        c_sc2 = Connection(subcooler, 'out1',
-                          hp.components['valve'], 'in1',
-                          label=f'{hp_name}_from_subcooler')
-        
-        # Subcooler cycle
-        c_sc3 = Connection(sc_evap, 'out1', sc_comp, 'in1',
-                          label=f'{hp_name}_sc_c1')
-        c_sc4 = Connection(sc_comp, 'out1', subcooler, 'in2',
-                          label=f'{hp_name}_sc_c2')
-        c_sc5 = Connection(subcooler, 'out2', sc_valve, 'in1',
-                          label=f'{hp_name}_sc_c3')
-        c_sc6 = Connection(sc_valve, 'out1', sc_evap, 'in1',
-                          label=f'{hp_name}_sc_c4')
-        
-        self.network.add_conns(c_sc1, c_sc2, c_sc3, c_sc4, c_sc5, c_sc6)
-        
-        # Set fluids
-        c_sc1.set_attr(fluid={hp.refrigerant: 1})
-        c_sc2.set_attr(fluid={hp.refrigerant: 1})
-        c_sc3.set_attr(fluid={subcooler_fluid: 1})
-        c_sc4.set_attr(fluid={subcooler_fluid: 1})
-        c_sc5.set_attr(fluid={subcooler_fluid: 1})
-        c_sc6.set_attr(fluid={subcooler_fluid: 1})
-        
-        return subcooler
-    
-    def create_parallel_cascades(self, cascade_configs):
-        """Create multiple cascades in parallel
-        cascade_configs: list of tuples [(hp1_name, hp2_name), ...]
-        """
-        merge_hot = Merge('merge_hot')
-        split_cold = Splitter('split_cold')
-        self.network.add_comps(merge_hot, split_cold)
-        
-        # Create individual cascades
-        for i, (hp1_name, hp2_name) in enumerate(cascade_configs):
-            self.create_cascade(hp1_name, hp2_name)
-        
-        # Connect to common heat source/sink
-        # This would need additional configuration based on specific system
+        # Filled by compile_system: cascade heat exchangers by (low, high) stage names,
+        # subcooler refrigeration cycles by main heat pump name, boundary water connections
+        self.cascades = {}
+        self.subcooler_cycles = {}
+        self.water = {}
+        self.spec = None
         
     def set_operating_conditions(self, hp_name, evap_temp, cond_temp, 
                                 superheat=5, subcooling=5):
-        """Set operating conditions for a heat pump"""
-        hp = self.heat_pumps[hp_name]
-        
-        # Find relevant connections
-        for conn in self.network.conns.values():
-            if conn.source == hp.components['compressor']:
-                # Compressor outlet (condenser inlet)
-                conn.set_attr(T=cond_temp + 15)  # Discharge temperature
-            elif conn.target == hp.components['compressor']:
-                # Compressor inlet
-                conn.set_attr(T=evap_temp + superheat)
-            elif conn.source == hp.components['valve']:
-                # Valve outlet (evaporator inlet)
-                conn.set_attr(T=evap_temp, x=0.2)  # Two-phase
-            elif conn.target == hp.components['valve']:
-                # Valve inlet
-                conn.set_attr(T=cond_temp - subcooling)
+        """Set operating conditions for a heat pump
+
+        Superheat at the compressor inlet and subcooling at the condenser outlet fix
+        the evaporation and condensation pressures; discharge temperature and
+        valve outlet quality follow from the solution.
+        """
+        self._set_cycle_conditions(self.heat_pumps[hp_name], evap_temp, cond_temp, superheat, subcooling)
+
+    @staticmethod
+    def _set_cycle_conditions(hp, evap_temp, cond_temp, superheat, subcooling):
+        hp.roles['suction'].set_attr(T=evap_temp + superheat, Td_bp=superheat)
+        hp.roles['liquid'].set_attr(T=cond_temp - subcooling, Td_bp=-subcooling)
+
+        # Saturation pressures as solver starting values
+        p_cond = saturation_pressure(hp.refrigerant, cond_temp + 273.15, Q=0) / 1e5
+        p_evap = saturation_pressure(hp.refrigerant, evap_temp + 273.15, Q=1) / 1e5
+        for role in ('discharge', 'liquid', 'subcooled'):
+            if role in hp.roles:
+                hp.roles[role].set_attr(p0=p_cond)
+        for role in ('expansion', 'evaporator_in'):
+            if role in hp.roles:
+                hp.roles[role].set_attr(p0=p_evap)
+
+    def set_subcooler_conditions(self, hp_name, outlet_temp, evap_temp, cond_temp,
+                                 superheat=5, subcooling=5):
+        """Set the refrigerant temperature leaving a subcooler and the subcooler cycle's conditions"""
+        self.heat_pumps[hp_name].roles['subcooled'].set_attr(T=outlet_temp)
+        self._set_cycle_conditions(self.subcooler_cycles[hp_name], evap_temp, cond_temp, superheat, subcooling)
     
-    def solve_system(self):
+    def solve_system(self, print_results=True):
         """Solve the thermodynamic system"""
         self.network.solve('design')
-        self.network.print_results()
+        if print_results:
+            self.network.print_results()
+        return self.network.converged
+
+    def apply_spec_conditions(self, spec):
+        """Set every operating condition given in a SystemSpec"""
+        for branch in spec.branches:
+            for stage in branch.stages:
+                self.set_operating_conditions(stage.name, stage.evap_temp, stage.cond_temp,
+                                              stage.superheat, stage.subcooling)
+            water = self.water[branch.stages[-1].name]
+            water['source_in'].set_attr(T=branch.source.T_in)
+            water['source_out'].set_attr(T=branch.source.T_out)
+            water['sink_in'].set_attr(T=branch.sink.T_in)
+            water['sink_out'].set_attr(T=branch.sink.T_out)
+            self.heat_pumps[branch.stages[-1].name].components['condenser'].set_attr(
+                Q=-branch.heat_output * 1e3)  # kW to W, heat leaves the refrigerant
+        for sc in spec.subcoolers:
+            self.set_subcooler_conditions(sc.heat_pump, sc.outlet_temp, sc.evap_temp, sc.cond_temp,
+                                          sc.superheat, sc.subcooling)
+
+    @classmethod
+    def sweep(cls, builder, variants, max_workers=None):
+        """Solve many operating-condition variants across a process pool.
+
+        builder: module-level function returning an unsolved CascadeHeatPumpSystem;
+                 each worker calls it once and re-solves that system for every variant
+        variants: list of {hp_name: set_operating_conditions kwargs}, e.g.
+                  [{'HP1': {'evap_temp': 5, 'cond_temp': 30}, 'HP2': {...}}, ...]
+
+        Returns a DataFrame with one row per variant, in order: the inputs as
+        '<hp>.<argument>' columns, 'converged', 'error', and the calculate_performance()
+        figures as '<cycle>.<metric>', 'system.<metric>' and 'cascade.<low>-><high>'
+        columns, computed for all variants in one pass (NaN where a solve failed).
+        """
+        workers = min(max_workers or SWEEP_WORKERS, len(variants)) or 1
+        # Contiguous chunks keep neighbouring variants in one worker, so each solve warm-starts
+        chunksize = max(1, len(variants) // (workers * 4))
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_sweep_worker,
+            initargs=(builder,)
+        ) as pool:
+            solved = list(pool.map(_solve_variant, variants, chunksize=chunksize))
+
+        df = pd.DataFrame([row for row, _, _ in solved])
+        layout = next((layout for _, layout, _ in solved if layout is not None), None)
+        if layout is None:
+            return df
+
+        # Performance of the whole sweep in one pass
+        power = np.full((len(solved), len(layout['compressors'])), np.nan)
+        heat = np.full((len(solved), len(layout['exchangers'])), np.nan)
+        for i, (_, _, vectors) in enumerate(solved):
+            if vectors is not None:
+                power[i], heat[i] = vectors
+        perf = performance_arrays(layout, power, heat)
+
+        columns = {}
+        for j, name in enumerate(layout['cycles']):
+            for key in ('compressor_power', 'condenser_duty', 'evaporator_duty', 'COP'):
+                columns[f'{name}.{key}'] = perf[key][:, j]
+        for key in ('total_power', 'total_heating', 'system_COP', 'subcooler_power'):
+            columns[f'system.{key}'] = perf[key]
+        for k, name in enumerate(layout['cascades']):
+            columns[f'cascade.{name}'] = perf['cascade_transfer'][:, k]
+        performance = pd.DataFrame(columns)
+        return pd.concat([df, performance], axis=1)
         
+    def cycles(self):
+        """Every refrigeration cycle by name, subcooler cycles included as '<hp>_sc'"""
+        cycles = dict(self.heat_pumps)
+        cycles.update({f'{name}_sc': hp for name, hp in self.subcooler_cycles.items()})
+        return cycles
+
+    def performance_layout(self):
+        """Where each cycle's power and heat flows are in network.results.
+
+        A cycle's condenser and evaporator are found through its connections, so they
+        follow cascade heat exchangers and subcoolers. Heat is delivered by condensers that
+        are not another cycle's evaporator and do not belong to a subcooler cycle
+        (which rejects to ambient); the other condensers are cascade heat exchangers.
+        """
+        cycles = self.cycles()
+        names = list(cycles)
+        condensers = []
+        evaporators = []
+        for hp in cycles.values():
+            condensers.append(hp.roles['discharge'].target.label)
+            evaporators.append(hp.roles['suction'].source.label)
+
+        exchangers = list(dict.fromkeys(condensers + evaporators))
+        position = {label: i for i, label in enumerate(exchangers)}
+        evaporator_of = dict(zip(evaporators, names))
+        is_subcooler_cycle = np.array([name not in self.heat_pumps for name in names])
+
+        sink = []
+        cascades = []
+        cascade_hx = []
+        for name, label, sc_cycle in zip(names, condensers, is_subcooler_cycle):
+            if label in evaporator_of:
+                cascades.append(f'{name}->{evaporator_of[label]}')
+                cascade_hx.append(position[label])
+            elif not sc_cycle:
+                sink.append(position[label])
+
+        return {
+            'cycles': names,
+            'subcooler_cycle': is_subcooler_cycle,
+            'compressors': [hp.components['compressor'].label for hp in cycles.values()],
+            'exchangers': exchangers,
+            'condenser': np.array([position[label] for label in condensers], dtype=int),
+            'evaporator': np.array([position[label] for label in evaporators], dtype=int),
+            'sink': np.array(sink, dtype=int),
+            'cascades': cascades,
+            'cascade_hx': np.array(cascade_hx, dtype=int),
+        }
+
+    def results_vectors(self, layout):
+        """Compressor powers and heat exchanger duties (W) in layout order, read from network.results"""
+        results = self.network.results
+        power = results['Compressor']['P'].reindex(layout['compressors']).to_numpy(dtype=float, copy=True)
+        duties = pd.concat([
+            results[table]['Q'] for table in ('HeatExchanger', 'Condenser', 'SimpleHeatExchanger')
+            if table in results and not results[table].empty
+        ])
+        heat = np.abs(duties.reindex(layout['exchangers']).to_numpy(dtype=float))
+        return power, heat
+
     def calculate_performance(self):
-        """Calculate system performance metrics"""
+        """Calculate system performance metrics (W) from the last solution"""
+        layout = self.performance_layout()
+        perf = performance_arrays(layout, *self.results_vectors(layout))
+
         results = {}
-        
-        for name, hp in self.heat_pumps.items():
-            comp = hp.components['compressor']
-            cond = hp.components['condenser']
-            evap = hp.components['evaporator']
-            
-            # Get power consumption and heat duties
-            W_comp = comp.P.val  # kW
-            Q_cond = cond.Q.val  # kW
-            Q_evap = evap.Q.val  # kW
-            
-            # Calculate COP
-            COP = abs(Q_cond / W_comp) if W_comp != 0 else 0
-            
+        for j, name in enumerate(layout['cycles']):
             results[name] = {
-                'compressor_power': W_comp,
-                'condenser_duty': Q_cond,
-                'evaporator_duty': Q_evap,
-                'COP': COP
+                'compressor_power': float(perf['compressor_power'][0, j]),
+                'condenser_duty': float(perf['condenser_duty'][0, j]),
+                'evaporator_duty': float(perf['evaporator_duty'][0, j]),
+                'COP': float(perf['COP'][0, j]),
             }
-        
-        # System COP
-        total_W = sum(r['compressor_power'] for r in results.values())
-        total_Q = sum(r['condenser_duty'] for r in results.values())
-        
         results['system'] = {
-            'total_power': total_W,
-            'total_heating': total_Q,
-            'system_COP': abs(total_Q / total_W) if total_W != 0 else 0
+            'total_power': float(perf['total_power'][0]),
+            'total_heating': float(perf['total_heating'][0]),
+            'system_COP': float(perf['system_COP'][0]),
+            'subcooler_power': float(perf['subcooler_power'][0]),
+            'cascade_transfer': {
+                name: float(perf['cascade_transfer'][0, k]) for k, name in enumerate(layout['cascades'])
+            },
         }
-        
         return results
     
     def generate_report(self):
@@ -256,61 +286,575 @@ class CascadeHeatPumpSystem:
         for name, data in perf.items():
             if name != 'system':
                 report += f"Heat Pump: {name}\n"
-                report += f"  Compressor Power: {data['compressor_power']:.2f} kW\n"
-                report += f"  Condenser Duty: {data['condenser_duty']:.2f} kW\n"
-                report += f"  Evaporator Duty: {data['evaporator_duty']:.2f} kW\n"
+                report += f"  Compressor Power: {data['compressor_power'] / 1e3:.2f} kW\n"
+                report += f"  Condenser Duty: {data['condenser_duty'] / 1e3:.2f} kW\n"
+                report += f"  Evaporator Duty: {data['evaporator_duty'] / 1e3:.2f} kW\n"
                 report += f"  COP: {data['COP']:.2f}\n\n"
         
         report += "System Performance:\n"
-        report += f"  Total Power: {perf['system']['total_power']:.2f} kW\n"
-        report += f"  Total Heating: {perf['system']['total_heating']:.2f} kW\n"
+        report += f"  Total Power: {perf['system']['total_power'] / 1e3:.2f} kW\n"
+        report += f"  Total Heating: {perf['system']['total_heating'] / 1e3:.2f} kW\n"
+        report += f"  Subcooler Power: {perf['system']['subcooler_power'] / 1e3:.2f} kW\n"
         report += f"  System COP: {perf['system']['system_COP']:.2f}\n"
         
         return report
 
 
+class HeatPumpSpec(BaseModel):
+    """One refrigeration cycle (stage) of a cascade"""
+    name: str
+    refrigerant: str
+    evap_temp: float            # °C
+    cond_temp: float            # °C
+    superheat: float = 5        # K
+    subcooling: float = 5       # K
+    eta_s: float = 0.8
+
+
+class SubcoolerSpec(BaseModel):
+    """Subcooler after a heat pump's condenser, cooled by its own refrigeration cycle"""
+    heat_pump: str
+    fluid: str = 'isobutane'
+    outlet_temp: float          # main refrigerant leaving the subcooler, °C
+    evap_temp: float            # subcooler cycle, °C
+    cond_temp: float            # subcooler cycle, heat rejected to ambient, °C
+    superheat: float = 5
+    subcooling: float = 5
+    eta_s: float = 0.8
+
+
+class WaterStreamSpec(BaseModel):
+    T_in: float                 # °C
+    T_out: float                # °C
+    p: float = 2                # bar
+
+
+class BranchSpec(BaseModel):
+    """One cascade between a water source and a water sink, stages from lowest to highest"""
+    stages: List[HeatPumpSpec]
+    heat_output: float          # kW delivered to the sink by the top stage
+    source: WaterStreamSpec
+    sink: WaterStreamSpec
+
+
+class SystemSpec(BaseModel):
+    """Parallel cascade branches plus optional subcoolers"""
+    branches: List[BranchSpec]
+    subcoolers: List[SubcoolerSpec] = []
+    pr: float = 0.98            # pressure ratio of every heat exchanger side
+
+    @model_validator(mode='after')
+    def check_names(self):
+        names = [stage.name for branch in self.branches for stage in branch.stages]
+        if not self.branches or any(not branch.stages for branch in self.branches):
+            raise ValueError('Every system needs at least one branch with at least one stage.')
+        if len(set(names)) != len(names):
+            raise ValueError('Heat pump names must be unique.')
+        cooled = [sc.heat_pump for sc in self.subcoolers]
+        if len(set(cooled)) != len(cooled) or not set(cooled) <= set(names):
+            raise ValueError('Each subcooler needs a distinct, existing heat_pump.')
+        return self
+
+
+# Spec fields that only set operating conditions; everything else is topology
+CONDITION_FIELDS = {
+    'evap_temp', 'cond_temp', 'superheat', 'subcooling', 'outlet_temp',
+    'heat_output', 'T_in', 'T_out'
+}
+
+
+def topology_key(spec):
+    """Hash of the spec without its operating conditions (plus the property backend): systems with the same key share a network."""
+    def strip(value):
+        if isinstance(value, dict):
+            return {k: strip(v) for k, v in value.items() if k not in CONDITION_FIELDS}
+        if isinstance(value, list):
+            return [strip(v) for v in value]
+        return value
+
+    payload = json.dumps({'spec': strip(spec.model_dump()), 'backend': PROPERTY_BACKEND}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _add_cycle(system, name, refrigerant, evaporator, condenser, eta_s, subcooler=None):
+    """Close one refrigerant loop: evaporator (cold side) -> compressor -> condenser (hot side) -> valve."""
+    cc = CycleCloser(f'{name}_cycle_closer')
+    comp = Compressor(f'{name}_comp')
+    valve = Valve(f'{name}_valve')
+    comp.set_attr(eta_s=eta_s)
+
+    roles = {
+        'evaporator_in': Connection(cc, 'out1', evaporator, 'in2', label=f'{name}_evap_in'),
+        'suction': Connection(evaporator, 'out2', comp, 'in1', label=f'{name}_suction'),
+        'discharge': Connection(comp, 'out1', condenser, 'in1', label=f'{name}_discharge'),
+        'expansion': Connection(valve, 'out1', cc, 'in1', label=f'{name}_expansion'),
+    }
+    if subcooler is None:
+        roles['liquid'] = Connection(condenser, 'out1', valve, 'in1', label=f'{name}_liquid')
+    else:
+        roles['liquid'] = Connection(condenser, 'out1', subcooler, 'in1', label=f'{name}_liquid')
+        roles['subcooled'] = Connection(subcooler, 'out1', valve, 'in1', label=f'{name}_subcooled')
+    system.network.add_conns(*roles.values())
+    roles['evaporator_in'].set_attr(fluid={tespy_fluid(refrigerant): 1})
+
+    hp = HeatPump(name, refrigerant, system.network, components={
+        'compressor': comp, 'condenser': condenser, 'valve': valve,
+        'evaporator': evaporator, 'cycle_closer': cc,
+    })
+    hp.connections = list(roles.values())
+    hp.roles = roles
+    return hp
+
+
+def compile_system(spec):
+    """Build the TESPy network for a SystemSpec and apply its operating conditions (not solved)."""
+    system = CascadeHeatPumpSystem()
+    system.network.set_attr(iterinfo=False)
+    system.spec = spec
+    subcooled = {sc.heat_pump: sc for sc in spec.subcoolers}
+
+    for branch in spec.branches:
+        stages = branch.stages
+        bottom, top = stages[0].name, stages[-1].name
+
+        # Heat exchanger i is the evaporator of stage i and the condenser of stage i - 1
+        exchangers = [HeatExchanger(f'{bottom}_evap')]
+        for low, high in zip(stages, stages[1:]):
+            cascade_hx = HeatExchanger(f'cascade_hx_{low.name}_{high.name}')
+            system.cascades[(low.name, high.name)] = cascade_hx
+            system.cascade_hx = cascade_hx
+            exchangers.append(cascade_hx)
+        exchangers.append(HeatExchanger(f'{top}_cond'))
+        for hx in exchangers:
+            hx.set_attr(pr1=spec.pr, pr2=spec.pr)
+
+        for i, stage in enumerate(stages):
+            subcooler = None
+            if stage.name in subcooled:
+                subcooler = HeatExchanger(f'{stage.name}_subcooler')
+                subcooler.set_attr(pr1=spec.pr, pr2=spec.pr)
+                system.subcoolers[stage.name] = subcooler
+            system.heat_pumps[stage.name] = _add_cycle(
+                system, stage.name, stage.refrigerant, exchangers[i], exchangers[i + 1],
+                stage.eta_s, subcooler
+            )
+            if subcooler is not None:
+                sc = subcooled[stage.name]
+                sc_cond = HeatExchangerSimple(f'{stage.name}_sc_cond')
+                sc_cond.set_attr(pr=spec.pr)
+                system.subcooler_cycles[stage.name] = _add_cycle(
+                    system, f'{stage.name}_sc', sc.fluid, subcooler, sc_cond, sc.eta_s
+                )
+
+        # Water source through the bottom evaporator, water sink through the top condenser
+        water = {
+            'source_in': Connection(Source(f'{bottom}_source'), 'out1', exchangers[0], 'in1',
+                                    label=f'{bottom}_source_in'),
+            'source_out': Connection(exchangers[0], 'out1', Sink(f'{bottom}_source_return'), 'in1',
+                                     label=f'{bottom}_source_out'),
+            'sink_in': Connection(Source(f'{top}_sink_return'), 'out1', exchangers[-1], 'in2',
+                                  label=f'{top}_sink_in'),
+            'sink_out': Connection(exchangers[-1], 'out2', Sink(f'{top}_sink'), 'in1',
+                                   label=f'{top}_sink_out'),
+        }
+        system.network.add_conns(*water.values())
+        water['source_in'].set_attr(fluid={tespy_fluid('water'): 1}, p=branch.source.p)
+        water['sink_in'].set_attr(fluid={tespy_fluid('water'): 1}, p=branch.sink.p)
+        system.water[top] = water
+
+    system.apply_spec_conditions(spec)
+    return system
+
+
+def checkout_system(spec):
+    """Take a compiled system with this spec's topology (or compile one) for exclusive use.
+
+    A cached system keeps its last solution, so solving it at the spec's conditions
+    starts from there instead of from scratch.
+    """
+    key = topology_key(spec)
+    with _compiled_systems_lock:
+        system = _compiled_systems.pop(key, None)
+    if system is None:
+        return compile_system(spec)
+    system.spec = spec
+    system.apply_spec_conditions(spec)
+    return system
+
+
+def checkin_system(system):
+    """Return a solved system to the cache for the next request with the same topology."""
+    key = topology_key(system.spec)
+    with _compiled_systems_lock:
+        if key in _compiled_systems:
+            return
+        _compiled_systems[key] = system
+        while len(_compiled_systems) > MAX_COMPILED_SYSTEMS:
+            _compiled_systems.popitem(last=False)
+
+
+@cascade_bp.route('/simulate', methods=['POST'])
+def simulate_cascade():
+    """Solve a cascade system: {"spec": SystemSpec, "fields": optional results tables}.
+
+    A system with the same topology as an earlier request in this worker is re-solved
+    from that solution, so requests that only change operating conditions are cheap.
+    """
+    data = request.get_json()
+    try:
+        spec = SystemSpec(**data.get('spec', {}))
+        _, tables = parse_fields(data.get('fields', []))
+    except (ValidationError, ValueError, TypeError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    try:
+        with _compiled_systems_lock:
+            cached = topology_key(spec) in _compiled_systems
+        # Unknown fluids and conditions outside a fluid's range fail here, in CoolProp
+        system = checkout_system(spec)
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    try:
+        converged = system.solve_system(print_results=False)
+    except Exception as e:
+        # The network is unusable after a failed solve, so it is not returned to the cache
+        return jsonify({'status': 'error', 'message': str(e)})
+
+    payload = {
+        'status': 'success',
+        'converged': converged,
+        'performance': system.calculate_performance() if converged else None,
+    }
+    if converged:
+        try:
+            if tables:
+                payload['results'] = project_results(system.network.results, tables)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        finally:
+            checkin_system(system)
+
+    response = results_response(payload)
+    response.headers['X-Cache'] = 'hit' if cached else 'miss'
+    return response
+
+
+@cascade_bp.route('/cache', methods=['GET'])
+def cascade_cache():
+    with _compiled_systems_lock:
+        keys = list(_compiled_systems)
+    return jsonify({'entries': len(keys), 'max_entries': MAX_COMPILED_SYSTEMS, 'topologies': keys})
+
+
+@cascade_bp.route('/optimise', methods=['POST'])
+def optimise_cascade_route():
+    """Queue a search for Pareto-optimal refrigerant pairs and intermediate temperatures.
+
+    Body: {"spec": two-stage SystemSpec (default PR_IB_CASCADE_SPEC), "t_int_range",
+    "pairs", "approach", "grid_points", "max_batches", "patience", "tol"}, all optional.
+    Runs as a 'cascade.optimise' job; returns 202 with the job, whose result under
+    /jobs/<id>/result is the optimise_cascade result.
+    """
+    data = request.get_json() or {}
+    try:
+        optimise_request(data)
+    except (ValidationError, ValueError, TypeError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    try:
+        job = jobs_app.submit('cascade.optimise', data)
+    except jobs_app.JobQueueFull as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 429
+    return jobs_app.owned_response(jobs_app.job_summary(job), 202)
+
+
+def optimise_request(data):
+    """Validate an /optimise body and return (base_spec, optimise_cascade options); raises ValueError."""
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be an object.')
+    options = {k: data[k] for k in ('t_int_range', 'pairs', 'approach', 'grid_points',
+                                    'max_batches', 'patience', 'tol') if k in data}
+    base_spec = data.get('spec', PR_IB_CASCADE_SPEC)
+    SystemSpec(**base_spec)
+
+    grid_points = int(options.get('grid_points', 5))
+    max_batches = int(options.get('max_batches', 6))
+    if not 1 <= grid_points <= MAX_OPTIMISE_GRID_POINTS:
+        raise ValueError(f'grid_points must be between 1 and {MAX_OPTIMISE_GRID_POINTS}.')
+    if not 1 <= max_batches <= MAX_OPTIMISE_BATCHES:
+        raise ValueError(f'max_batches must be between 1 and {MAX_OPTIMISE_BATCHES}.')
+    if 'pairs' in options:
+        pairs = options['pairs']
+        if not pairs or any(len(pair) != 2 for pair in pairs):
+            raise ValueError('pairs must be a non-empty list of (low, high) refrigerants.')
+        if len(pairs) > MAX_OPTIMISE_PAIRS:
+            raise ValueError(f'At most {MAX_OPTIMISE_PAIRS} pairs per optimisation.')
+    return base_spec, options
+
+
+def run_optimise(data, progress=None):
+    """Job function for 'cascade.optimise': an /optimise body in, the optimise_cascade result out."""
+    base_spec, options = optimise_request(data)
+    return dict(optimise_cascade(base_spec, progress=progress, **options), status='success')
+
+
+def performance_arrays(layout, power, heat):
+    """Performance of many solutions at once.
+
+    power: compressor powers, shape (n, compressors); heat: heat exchanger duties,
+    shape (n, exchangers), both in performance_layout order (NaN rows for failed
+    solves). Per-cycle entries have shape (n, cycles), system totals shape (n,).
+    """
+    power = np.atleast_2d(power)
+    heat = np.atleast_2d(heat)
+    condenser_duty = heat[:, layout['condenser']]
+    total_power = power.sum(axis=1)
+    total_heating = heat[:, layout['sink']].sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cop = np.where(power != 0, condenser_duty / power, 0.0)
+        system_cop = np.where(total_power != 0, total_heating / total_power, 0.0)
+    return {
+        'compressor_power': power,
+        'condenser_duty': condenser_duty,
+        'evaporator_duty': heat[:, layout['evaporator']],
+        'COP': cop,
+        'total_power': total_power,
+        'total_heating': total_heating,
+        'system_COP': system_cop,
+        'subcooler_power': power[:, layout['subcooler_cycle']].sum(axis=1),
+        'cascade_transfer': heat[:, layout['cascade_hx']],
+    }
+
+
+def _init_sweep_worker(builder):
+    global _sweep_system, _sweep_builder
+    _sweep_builder = builder
+    _sweep_system = builder()
+
+
+def _solve_variant(variant):
+    """Apply one variant to this worker's system and solve it; returns (row, layout, results vectors)."""
+    global _sweep_system
+    row = {
+        f'{hp_name}.{arg}': value
+        for hp_name, conditions in variant.items()
+        for arg, value in conditions.items()
+    }
+    try:
+        for hp_name, conditions in variant.items():
+            _sweep_system.set_operating_conditions(hp_name, **conditions)
+        converged = _sweep_system.solve_system(print_results=False)
+    except Exception as e:
+        # A failed solve leaves the network unusable for the next variant
+        _sweep_system = _sweep_builder()
+        row.update(converged=False, error=str(e))
+        return row, None, None
+
+    row.update(converged=converged, error=None)
+    layout = _sweep_system.performance_layout()
+    if not converged:
+        return row, layout, None
+    return row, layout, _sweep_system.results_vectors(layout)
+
+
+def _evaluate_candidate(spec_dict):
+    """Solve one optimisation candidate in a worker, warm-starting from the last candidate of its topology."""
+    try:
+        spec = SystemSpec(**spec_dict)
+        system = checkout_system(spec)
+        converged = system.solve_system(print_results=False)
+    except Exception as e:
+        return {'converged': False, 'error': str(e)}
+    if not converged:
+        return {'converged': False, 'error': 'Did not converge.'}
+    system_perf = system.calculate_performance()['system']
+    # Compressor suction volume flow, m3/s: a proxy for compressor size and cost
+    suction_volume_flow = sum(float(hp.roles['suction'].vol.val) for hp in system.cycles().values())
+    checkin_system(system)
+    return {
+        'converged': True,
+        'system_COP': system_perf['system_COP'],
+        'total_power': system_perf['total_power'],
+        'suction_volume_flow': suction_volume_flow,
+    }
+
+
+def get_optimise_executor():
+    global _optimise_executor
+    with _optimise_executor_lock:
+        # A worker killed mid-solve breaks the whole pool; replace it for the next batch
+        if _optimise_executor is not None and getattr(_optimise_executor, '_broken', False):
+            print("[WARNING] Cascade optimisation pool is broken, restarting it")
+            _optimise_executor.shutdown(wait=False, cancel_futures=True)
+            _optimise_executor = None
+        if _optimise_executor is None:
+            _optimise_executor = ProcessPoolExecutor(
+                max_workers=SWEEP_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            # In a job worker (a multiprocessing child) the pool must be shut down before
+            # multiprocessing joins the child's processes at exit, or that join never returns
+            Finalize(_optimise_executor, _optimise_executor.shutdown, exitpriority=100)
+        return _optimise_executor
+
+
+def pareto_front(points):
+    """Candidates not dominated on (max system_COP, min suction_volume_flow).
+
+    At a fixed heat output the total power is fixed by the COP, so the competing
+    objective is compressor size: low-pressure refrigerants such as isobutane reach
+    higher COPs but need a larger suction volume flow.
+    """
+    return [
+        p for p in points
+        if not any(
+            q['system_COP'] >= p['system_COP'] and q['suction_volume_flow'] <= p['suction_volume_flow']
+            and (q['system_COP'] > p['system_COP'] or q['suction_volume_flow'] < p['suction_volume_flow'])
+            for q in points
+        )
+    ]
+
+
+def hypervolume(front, reference):
+    """Area dominated by the front up to the reference (system_COP, suction_volume_flow).
+
+    Points worse than the reference in either objective add nothing.
+    """
+    ref_cop, ref_volume = reference
+    area = 0.0
+    prev_cop = ref_cop
+    # Along the front, COP and volume flow rise together
+    for p in sorted(front, key=lambda p: p['system_COP']):
+        if p['system_COP'] <= prev_cop:
+            continue
+        area += max(ref_volume - p['suction_volume_flow'], 0.0) * (p['system_COP'] - prev_cop)
+        prev_cop = p['system_COP']
+    return area
+
+
+def optimise_cascade(base_spec, t_int_range=(15, 35), pairs=None, approach=5,
+                     grid_points=5, max_batches=6, patience=2, tol=1e-3, executor=None,
+                     progress=None):
+    """Search the intermediate temperature and refrigerant pair of a two-stage cascade.
+
+    base_spec: SystemSpec dict with one branch of two stages; everything but the
+               refrigerants, the high stage's evap_temp and the low stage's cond_temp is kept
+    t_int_range: bounds of the intermediate temperature, the high stage's evaporation, °C
+    pairs: (low, high) refrigerants; defaults to every ordered pair of the network's
+           refrigerants (FLUIDS without water)
+    approach: low stage condensation above the intermediate temperature, K
+
+    The first batch is a grid of `grid_points` temperatures per pair. Each further batch
+    halves the temperature step and evaluates the neighbours of the current Pareto
+    front (max system_COP, min suction_volume_flow, see pareto_front). The search stops
+    after `max_batches`, when there is nothing new to evaluate, or when the front's
+    hypervolume has grown by less than `tol` (relative) for `patience` batches in a row.
+    Candidates in a batch are solved in parallel; results are memoised in optimise_cache.
+    `progress`, if given, is called with keyword updates (batch, candidate, candidates)
+    as each candidate finishes.
+    """
+    branches = base_spec.get('branches', [])
+    if len(branches) != 1 or len(branches[0].get('stages', [])) != 2:
+        raise ValueError('Optimisation needs a spec with one branch of two stages.')
+    t_low, t_high = map(float, t_int_range)
+    if not t_low < t_high:
+        raise ValueError('t_int_range must be increasing.')
+
+    if pairs is None:
+        refrigerants = [f for f in CascadeHeatPumpSystem.FLUIDS if f != 'water']
+        pairs = [(low, high) for low in refrigerants for high in refrigerants]
+    pairs = [tuple(pair) for pair in pairs]
+    executor = executor or get_optimise_executor()
+    report = progress or (lambda **info: None)
+
+    def candidate_spec(pair, t_int):
+        low, high = [dict(stage) for stage in branches[0]['stages']]
+        low.update(refrigerant=pair[0], cond_temp=t_int + approach)
+        high.update(refrigerant=pair[1], evap_temp=t_int)
+        return dict(base_spec, branches=[dict(branches[0], stages=[low, high])])
+
+    evaluated = {}
+    front = []
+    step = (t_high - t_low) / (grid_points - 1) if grid_points > 1 else t_high - t_low
+    batch = [(pair, round(float(t), 6)) for pair in pairs for t in np.linspace(t_low, t_high, grid_points)]
+    reference = None
+    volume = 0.0
+    stale = 0
+    batches = 0
+
+    while batch and batches < max_batches:
+        batches += 1
+        specs = [candidate_spec(pair, t_int) for pair, t_int in batch]
+        keys = [optimise_cache.key(dict(spec, performance_version=PERFORMANCE_VERSION, backend=PROPERTY_BACKEND)) for spec in specs]
+        results = [optimise_cache.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        report(batch=batches, candidate=0, candidates=len(missing))
+        solved = executor.map(_evaluate_candidate, [specs[i] for i in missing])
+        for k, (i, result) in enumerate(zip(missing, solved)):
+            report(batch=batches, candidate=k + 1, candidates=len(missing))
+            results[i] = result
+            if result['converged']:
+                optimise_cache.set(keys[i], result)
+
+        for (pair, t_int), result in zip(batch, results):
+            evaluated[(pair, t_int)] = dict(result, pair=list(pair), t_int=t_int)
+
+        feasible = [e for e in evaluated.values() if e['converged']]
+        front = pareto_front(feasible)
+        if reference is None and feasible:
+            # Worst COP and volume flow of the first batch, fixed so hypervolumes stay comparable
+            reference = (min(e['system_COP'] for e in feasible), max(e['suction_volume_flow'] for e in feasible))
+        new_volume = hypervolume(front, reference) if reference else 0.0
+        improved = new_volume > volume * (1 + tol) or batches == 1
+        volume = new_volume
+        stale = 0 if improved else stale + 1
+        if stale >= patience:
+            break
+
+        # Refine around the front
+        step /= 2
+        batch = []
+        for point in front:
+            for t_int in (point['t_int'] - step, point['t_int'] + step):
+                candidate = (tuple(point['pair']), round(t_int, 6))
+                if t_low <= t_int <= t_high and candidate not in evaluated and candidate not in batch:
+                    batch.append(candidate)
+
+    return {
+        'front': sorted(front, key=lambda p: -p['system_COP']),
+        'evaluated': sorted(evaluated.values(), key=lambda e: (e['pair'], e['t_int'])),
+        'batches': batches,
+        'hypervolume': volume,
+        'stopped_early': stale >= patience,
+    }
+
+
 # Example usage
+
+# Propane/Isobutane cascade between a 10 °C water source and a 40 -> 55 °C water sink
+PR_IB_CASCADE_SPEC = {
+    'branches': [{
+        'stages': [
+            {'name': 'HP1', 'refrigerant': 'propane', 'evap_temp': 5, 'cond_temp': 30},
+            {'name': 'HP2', 'refrigerant': 'isobutane', 'evap_temp': 25, 'cond_temp': 60},
+        ],
+        'heat_output': 100,
+        'source': {'T_in': 10, 'T_out': 7},
+        'sink': {'T_in': 40, 'T_out': 55},
+    }],
+}
+
+
+def build_pr_ib_cascade():
+    """Propane/Isobutane cascade with water source and sink, not yet solved"""
+    return compile_system(SystemSpec(**PR_IB_CASCADE_SPEC))
+
+
 def example_pr_ib_cascade():
     """Example: Propane/Isobutane cascade system"""
-    system = CascadeHeatPumpSystem()
-    
-    # Add heat pumps
-    hp1 = system.add_heat_pump('HP1', 'propane')
-    hp2 = system.add_heat_pump('HP2', 'isobutane')
-    
-    # Connect basic cycles
-    hp1.connect_cycle()
-    hp2.connect_cycle()
-    
-    # Create cascade connection
-    system.create_cascade('HP1', 'HP2')
-    
-    # Add heat source and sink
-    source_in = Source('heat_source_in')
-    source_out = Sink('heat_source_out')
-    sink_in = Source('heat_sink_in')
-    sink_out = Sink('heat_sink_out')
-    
-    system.network.add_comps(source_in, source_out, sink_in, sink_out)
-    
-    # Connect heat source to HP1 evaporator
-    c_src1 = Connection(source_in, 'out1', hp1.components['evaporator'], 'in2')
-    c_src2 = Connection(hp1.components['evaporator'], 'out2', source_out, 'in1')
-    
-    # Connect heat sink to HP2 condenser
-    c_snk1 = Connection(sink_in, 'out1', hp2.components['condenser'], 'in2')
-    c_snk2 = Connection(hp2.components['condenser'], 'out2', sink_out, 'in1')
-    
-    system.network.add_conns(c_src1, c_src2, c_snk1, c_snk2)
-    
-    # Set water properties
-    c_src1.set_attr(fluid={'water': 1}, T=10, p=2, m=1)
-    c_snk1.set_attr(fluid={'water': 1}, T=40, p=2, m=0.5)
-    
-    # Set operating conditions
-    system.set_operating_conditions('HP1', evap_temp=5, cond_temp=30)
-    system.set_operating_conditions('HP2', evap_temp=25, cond_temp=60)
-    
+    system = build_pr_ib_cascade()
+
     # Solve and report
     system.solve_system()
     print(system.generate_report())
@@ -320,27 +864,36 @@ def example_pr_ib_cascade():
 
 def example_parallel_cascades_with_subcooler():
     """Example: Parallel cascades with subcooler"""
-    system = CascadeHeatPumpSystem()
-    
-    # Create multiple cascade units
-    for i in range(2):
-        hp1 = system.add_heat_pump(f'HP1_{i}', 'propane')
-        hp2 = system.add_heat_pump(f'HP2_{i}', 'isobutane')
-        hp1.connect_cycle()
-        hp2.connect_cycle()
-        system.create_cascade(f'HP1_{i}', f'HP2_{i}')
-    
-    # Add subcooler to one cascade
-    system.add_subcooler('HP2_0', 'isobutane')
-    
-    # Configure and solve
-    for i in range(2):
-        system.set_operating_conditions(f'HP1_{i}', evap_temp=5, cond_temp=30)
-        system.set_operating_conditions(f'HP2_{i}', evap_temp=25, cond_temp=60)
-    
+    branch = PR_IB_CASCADE_SPEC['branches'][0]
+    spec = SystemSpec(
+        # Two copies of the Propane/Isobutane cascade side by side
+        branches=[
+            dict(branch, stages=[dict(stage, name=f"{stage['name']}_{i}") for stage in branch['stages']])
+            for i in range(2)
+        ],
+        # Subcooler on one cascade
+        subcoolers=[{'heat_pump': 'HP2_0', 'fluid': 'isobutane',
+                     'outlet_temp': 40, 'evap_temp': 30, 'cond_temp': 50}],
+    )
+    system = compile_system(spec)
+
+    # Solve and report
+    system.solve_system()
+    print(system.generate_report())
+
     return system
 
 
+def example_pr_ib_sweep():
+    """Example: HP2 condensing temperature sweep of the Propane/Isobutane cascade"""
+    variants = [
+        {'HP1': {'evap_temp': 5, 'cond_temp': 30},
+         'HP2': {'evap_temp': 25, 'cond_temp': cond_temp}}
+        for cond_temp in range(50, 71, 2)
+    ]
+    return CascadeHeatPumpSystem.sweep(build_pr_ib_cascade, variants)
+
+
 if __name__ == "__main__":
     # Run example
     cascade_system = example_pr_ib_cascade()
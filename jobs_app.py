@@ -0,0 +1,347 @@
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+import atexit
+import importlib
+import json
+import multiprocessing
+import math
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError
+from uuid import uuid4
+
+import numpy as np
+
+from custominput_app import worker_id
+from tespy_results import results_response
+
+jobs_bp = Blueprint('jobs', __name__)
+
+# Concurrent solves, queued jobs beyond that, and how long finished jobs are kept (seconds)
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+JOB_QUEUE_DEPTH = int(os.getenv('JOB_QUEUE_DEPTH', 16))
+JOB_RESULT_TTL = float(os.getenv('JOB_RESULT_TTL', 3600))
+
+# Bounds for the ?interval= polling period of the events stream (seconds)
+MIN_EVENT_INTERVAL = 0.1
+MAX_EVENT_INTERVAL = 10.0
+
+# Cookie carrying the worker that owns a job, for load balancers doing sticky routing
+JOB_WORKER_COOKIE = 'job_worker'
+
+# Job kinds: { kind: 'module:function' }, called in a worker as function(params, progress=...)
+JOB_KINDS = {
+    'heatpumpadv.parametric-cop': 'heatpumpadv_app:run_parametric_cop',
+    'heatpump.sweep': 'heatpump_app:run_sweep',
+    'oandm.manual': 'oandm_app:run_manual',
+    'cascade.optimise': 'hp_cascade_app:run_optimise',
+}
+
+# Job records in this process: { job_id: job }. Ids are '<uuid>@<worker_id>' so that a
+# request routed to another gunicorn worker gets 421 with the owner instead of a 404.
+jobs = {}
+_jobs_lock = threading.Lock()
+
+# Pool and the manager-backed dicts shared with its workers, created on first submit
+_executor = None
+_manager = None
+_progress = None
+_cancelled = None
+_executor_lock = threading.Lock()
+
+# Worker-side state
+_worker_progress = None
+_worker_cancelled = None
+_current_job = None
+
+
+class JobCancelled(BaseException):
+    """Raised inside a running job on cancellation.
+
+    A BaseException, like KeyboardInterrupt, so the `except Exception` handlers that
+    job functions use to skip a failed point do not swallow it.
+    """
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def _report(**info):
+    """Publish progress for the job running in this worker; aborts the job if it was cancelled."""
+    if _current_job is None:
+        return
+    if _current_job['id'] in _worker_cancelled:
+        raise JobCancelled()
+    _current_job['progress'].update(info, updated=time.time())
+    _worker_progress[_current_job['id']] = dict(_current_job['progress'])
+
+
+def in_job_worker():
+    """True in a job pool worker process."""
+    return _worker_progress is not None
+
+
+def _init_job_worker(progress, cancelled):
+    """Process pool initializer: keep the shared dicts and report TESPy Newton iterations."""
+    global _worker_progress, _worker_cancelled
+    _worker_progress = progress
+    _worker_cancelled = cancelled
+
+    from tespy.networks import Network
+    solve_control = getattr(Network, 'solve_control', None)
+    if solve_control is None:
+        return
+
+    def solve_control_with_progress(self):
+        solve_control(self)
+        _report(iteration=int(self.iter) + 1, residual=float(np.linalg.norm(self.residual)))
+
+    Network.solve_control = solve_control_with_progress
+
+
+def _run_job(job_id, kind, params):
+    """Worker entry point: resolve the job kind and run it with progress reporting."""
+    global _current_job
+    module_name, func_name = JOB_KINDS[kind].split(':')
+    func = getattr(importlib.import_module(module_name), func_name)
+
+    _current_job = {'id': job_id, 'progress': {'started': time.time()}}
+    try:
+        _report()
+        return func(params, progress=_report)
+    finally:
+        _current_job = None
+
+
+def missing_job_response(job_id):
+    """Error response for an unknown job; 421 if it belongs to another worker."""
+    owner = job_id.rpartition('@')[2] if '@' in job_id else None
+    if owner and owner != worker_id():
+        return jsonify({'error': 'Job is owned by another worker.', 'worker': owner}), 421
+    return jsonify({'error': 'Unknown or expired job_id.'}), 404
+
+
+def owned_response(body, status):
+    """JSON response that also sets the job affinity cookie."""
+    response = jsonify(body)
+    response.set_cookie(JOB_WORKER_COOKIE, worker_id())
+    return response, status
+
+
+def get_executor():
+    global _executor, _manager, _progress, _cancelled
+    with _executor_lock:
+        # A worker that died (OOM kill, segfault in a solver) breaks the whole pool, whose
+        # jobs then fail with BrokenProcessPool; start a fresh pool for the next submit
+        if _executor is not None and getattr(_executor, '_broken', False):
+            print("[WARNING] Job worker pool is broken, restarting it")
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+        if _executor is None:
+            ctx = multiprocessing.get_context('spawn')
+            if _manager is None:
+                _manager = ctx.Manager()
+                _progress = _manager.dict()
+                _cancelled = _manager.dict()
+            _executor = ProcessPoolExecutor(
+                max_workers=JOB_WORKERS,
+                mp_context=ctx,
+                initializer=_init_job_worker,
+                initargs=(_progress, _cancelled)
+            )
+        return _executor
+
+
+@atexit.register
+def _shutdown_job_pool():
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _manager.shutdown()
+
+
+def purge_expired_jobs():
+    """Forget finished jobs whose results are older than JOB_RESULT_TTL."""
+    now = time.time()
+    with _jobs_lock:
+        expired = [job_id for job_id, job in jobs.items()
+                   if job['finished'] is not None and now - job['finished'] > JOB_RESULT_TTL]
+        for job_id in expired:
+            del jobs[job_id]
+    for job_id in expired:
+        if _progress is not None:
+            _progress.pop(job_id, None)
+            _cancelled.pop(job_id, None)
+
+
+def job_status(job):
+    future = job['future']
+    if job['cancel_requested'] and not future.done():
+        return 'cancelling'
+    if future.cancelled():
+        return 'cancelled'
+    if future.done():
+        exc = future.exception()
+        if isinstance(exc, JobCancelled):
+            return 'cancelled'
+        return 'failed' if exc is not None else 'done'
+    return 'running' if future.running() else 'queued'
+
+
+def job_summary(job):
+    summary = {
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job_status(job),
+        'submitted': job['submitted'],
+        'finished': job['finished'],
+        'progress': dict(_progress.get(job['id'], {})) if _progress is not None else {},
+    }
+    if summary['status'] == 'failed':
+        summary['error'] = str(job['future'].exception())
+    return summary
+
+
+def _on_done(job_id):
+    def callback(future):
+        with _jobs_lock:
+            job = jobs.get(job_id)
+            if job is not None:
+                job['finished'] = time.time()
+    return callback
+
+
+def submit(kind, params):
+    """Queue a job of a JOB_KINDS kind and return its record; raises JobQueueFull."""
+    purge_expired_jobs()
+    with _jobs_lock:
+        pending = sum(1 for job in jobs.values() if not job['future'].done())
+    if pending >= JOB_WORKERS + JOB_QUEUE_DEPTH:
+        raise JobQueueFull('Job queue is full, try again later.')
+
+    job_id = f"{uuid4()}@{worker_id()}"
+    future = get_executor().submit(_run_job, job_id, kind, params)
+
+    job = {
+        'id': job_id,
+        'kind': kind,
+        'future': future,
+        'submitted': time.time(),
+        'finished': None,
+        'cancel_requested': False,
+    }
+    with _jobs_lock:
+        jobs[job_id] = job
+    future.add_done_callback(_on_done(job_id))
+    return job
+
+
+@jobs_bp.route('/', methods=['POST'])
+def submit_job():
+    """Queue a job: {"kind": <one of JOB_KINDS>, "params": {...}}."""
+    data = request.get_json()
+    kind = data.get('kind')
+    params = data.get('params', {})
+
+    if kind not in JOB_KINDS:
+        return jsonify({'error': f'Unknown job kind. Available: {sorted(JOB_KINDS)}'}), 400
+    if not isinstance(params, dict):
+        return jsonify({'error': 'params must be an object.'}), 400
+
+    try:
+        job = submit(kind, params)
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 429
+    except Exception as e:
+        print(f"[ERROR] Error submitting job: {e}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+    return owned_response(job_summary(job), 202)
+
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    purge_expired_jobs()
+    job = jobs.get(job_id)
+    if job is None:
+        return missing_job_response(job_id)
+    return jsonify(job_summary(job))
+
+
+@jobs_bp.route('/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    purge_expired_jobs()
+    job = jobs.get(job_id)
+    if job is None:
+        return missing_job_response(job_id)
+
+    status = job_status(job)
+    if status != 'done':
+        return jsonify(job_summary(job)), 409 if status in ('queued', 'running', 'cancelling') else 410
+
+    return results_response(job['future'].result())
+
+
+@jobs_bp.route('/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued job at once; a running job stops at its next progress report."""
+    job = jobs.get(job_id)
+    if job is None:
+        return missing_job_response(job_id)
+
+    if not job['future'].done():
+        job['cancel_requested'] = True
+        if not job['future'].cancel():
+            _cancelled[job_id] = True
+    return jsonify(job_summary(job))
+
+
+@jobs_bp.route('/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-Sent Events stream of job progress until the job finishes."""
+    job = jobs.get(job_id)
+    if job is None:
+        return missing_job_response(job_id)
+
+    try:
+        interval = float(request.args.get('interval', 0.5))
+    except ValueError:
+        return jsonify({'error': 'interval must be a number of seconds.'}), 400
+    if not math.isfinite(interval):
+        return jsonify({'error': 'interval must be a number of seconds.'}), 400
+    interval = min(max(interval, MIN_EVENT_INTERVAL), MAX_EVENT_INTERVAL)
+
+    def generate():
+        last = None
+        while True:
+            summary = job_summary(job)
+            if summary != last:
+                yield f"data: {json.dumps(summary)}\n\n"
+                last = summary
+            if summary['status'] in ('done', 'failed', 'cancelled'):
+                yield f"event: end\ndata: {json.dumps({'status': summary['status']})}\n\n"
+                return
+            try:
+                job['future'].exception(timeout=interval)
+            except (CancelledError, TimeoutError):
+                pass
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@jobs_bp.route('/', methods=['GET'])
+def list_jobs():
+    purge_expired_jobs()
+    with _jobs_lock:
+        current = list(jobs.values())
+    return jsonify({
+        'workers': JOB_WORKERS,
+        'queue_depth': JOB_QUEUE_DEPTH,
+        'jobs': [job_summary(job) for job in current],
+    })
@@ -1,63 +1,107 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, url_for
+import json
 import os
+import random
+import threading
+import time
 import uuid
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from werkzeug.utils import secure_filename
 from docx import Document
-from openai import OpenAI
+from openai import OpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+import jobs_app
+from result_cache import ResultCache
 
 oandm_bp = Blueprint("oandm", __name__)
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+# OPENAI_BASE_URL points the client at another endpoint, e.g. a local stub for testing.
+# Retries are done in generate_section so they can honour Retry-After across the pool.
+OANDM_MODEL = os.getenv("OANDM_MODEL", "gpt-4o")
+OANDM_LLM_WORKERS = int(os.getenv("OANDM_LLM_WORKERS", 4))        # concurrent section requests
+OANDM_LLM_TIMEOUT = float(os.getenv("OANDM_LLM_TIMEOUT", 120))    # seconds per request
+OANDM_LLM_RETRIES = int(os.getenv("OANDM_LLM_RETRIES", 4))        # retries after the first attempt
+OANDM_LLM_BACKOFF = float(os.getenv("OANDM_LLM_BACKOFF", 2))      # base of the exponential backoff (s)
+OANDM_LLM_MAX_BACKOFF = float(os.getenv("OANDM_LLM_MAX_BACKOFF", 60))
+
+# Created on first use, so the app starts without OPENAI_API_KEY; sections fail without it
+_client = None
+_client_lock = threading.Lock()
+
+# Generated sections are kept on disk, keyed by the prompt, so a re-upload only regenerates the
+# equipment groups whose file list changed. OANDM_CACHE_DIR='' keeps them in memory only.
+OANDM_CACHE_DIR = os.getenv("OANDM_CACHE_DIR", "app/cache")
+OANDM_CACHE_MAX_AGE = float(os.getenv("OANDM_CACHE_MAX_AGE", 30 * 24 * 3600))  # seconds
+OANDM_CACHE_MAX_MB = float(os.getenv("OANDM_CACHE_MAX_MB", 50))
+
+section_cache = ResultCache(
+    "oandm-sections",
+    max_entries=256,
+    disk_dir=OANDM_CACHE_DIR or None,
+    max_age=OANDM_CACHE_MAX_AGE,
+    max_disk_bytes=int(OANDM_CACHE_MAX_MB * 1024 * 1024),
+)
+
+SYSTEM_PROMPT = "You are an expert in technical documentation for engineers."
+
+# Errors worth retrying; anything else (auth, bad request) fails the section at once
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+FAILED_SECTION_TEXT = "⚠️ Failed to generate AI content."
 
 UPLOAD_FOLDER = "app/uploads"
 GENERATED_FOLDER = "app/generated"
+MANIFEST_NAME = "manifest.json"  # original upload paths, which secure_filename flattens
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(GENERATED_FOLDER, exist_ok=True)
 
-@oandm_bp.route("/ping", methods=["GET"])
-def ping():
-    return jsonify({"message": "O&M module is alive."})
+# One pool per process, shared by its requests. /upload runs in the web process with
+# OANDM_LLM_WORKERS threads; each job worker gets an equal share of OANDM_LLM_WORKERS,
+# so queued manuals together stay within it whatever JOB_WORKERS is.
+_llm_executor = None
+_llm_executor_lock = threading.Lock()
 
-@oandm_bp.route("/upload", methods=["POST"])
-def upload_files():
-    try:
-        folder_id = str(uuid.uuid4())
-        folder_path = os.path.join(UPLOAD_FOLDER, folder_id)
-        os.makedirs(folder_path, exist_ok=True)
 
-        files = request.files.getlist("files[]")
-        if not files:
-            return jsonify({"error": "No files received."}), 400
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                base_url=os.getenv("OPENAI_BASE_URL") or None,
+                timeout=OANDM_LLM_TIMEOUT,
+                max_retries=0,
+            )
+        return _client
 
-        for file in files:
-            filename = secure_filename(file.filename)
-            full_path = os.path.join(folder_path, filename)
-            os.makedirs(os.path.dirname(full_path), exist_ok=True)
-            file.save(full_path)
-
-        # Start generating the document
-        doc = Document()
-        doc.add_heading("Operations & Maintenance Manual", 0)
-
-        # Group files by first-level directory
-        equipment_sections = {}
-        for file in files:
-            parts = file.filename.split("/")
-            if len(parts) > 1:
-                equipment = parts[0]
-            else:
-                equipment = "General"
-            equipment_sections.setdefault(equipment, []).append(parts[-1])
 
-        for equipment, file_list in equipment_sections.items():
-            doc.add_page_break()
-            doc.add_heading(f"Equipment: {equipment}", level=1)
-            doc.add_paragraph("Included files:")
-            for f in file_list:
-                doc.add_paragraph(f"• {f}")
+def get_llm_executor():
+    global _llm_executor
+    with _llm_executor_lock:
+        if _llm_executor is None:
+            workers = OANDM_LLM_WORKERS
+            if jobs_app.in_job_worker():
+                workers = max(1, OANDM_LLM_WORKERS // jobs_app.JOB_WORKERS)
+            _llm_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="oandm-llm")
+        return _llm_executor
+
+
+def group_files(filenames):
+    """Group uploaded paths by first-level directory: { equipment: [file names] }, in upload order."""
+    equipment_sections = {}
+    for filename in filenames:
+        parts = filename.split("/")
+        if len(parts) > 1:
+            equipment = parts[0]
+        else:
+            equipment = "General"
+        equipment_sections.setdefault(equipment, []).append(parts[-1])
+    return equipment_sections
 
-            # Generate GPT-based section
-            prompt = f"""You are a professional process engineer creating an Operations & Maintenance manual.
+
+def section_prompt(equipment, file_list):
+    return f"""You are a professional process engineer creating an Operations & Maintenance manual.
 
 Equipment: {equipment}
 Files: {file_list}
@@ -73,22 +117,214 @@ Write a detailed and structured section for this equipment including:
 
 Be technical and realistic. Format with proper headings."""
 
-            try:
-                response = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[
-                        {"role": "system", "content": "You are an expert in technical documentation for engineers."},
-                        {"role": "user", "content": prompt}
-                    ]
-                )
-                gpt_text = response.choices[0].message.content
-                doc.add_paragraph(gpt_text)
-            except Exception as gpt_error:
-                doc.add_paragraph("⚠️ Failed to generate AI content.")
-                print("GPT error for equipment:", equipment, gpt_error)
+
+def _retry_delay(error, attempt):
+    """Seconds to wait before the next attempt: the server's Retry-After if given, else exponential backoff."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        try:
+            if retry_after is not None:
+                return min(float(retry_after), OANDM_LLM_MAX_BACKOFF)
+        except ValueError:
+            pass
+    delay = min(OANDM_LLM_BACKOFF * 2 ** attempt, OANDM_LLM_MAX_BACKOFF)
+    return delay * random.uniform(0.5, 1.0)  # jitter so parallel sections do not retry in lockstep
+
+
+def generate_section(equipment, file_list):
+    """GPT text for one equipment section, retrying rate limits, timeouts and server errors."""
+    for attempt in range(OANDM_LLM_RETRIES + 1):
+        try:
+            response = get_client().chat.completions.create(
+                model=OANDM_MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": section_prompt(equipment, file_list)}
+                ],
+                timeout=OANDM_LLM_TIMEOUT,
+            )
+            return response.choices[0].message.content
+        except RETRYABLE_ERRORS as e:
+            if attempt == OANDM_LLM_RETRIES:
+                raise
+            delay = _retry_delay(e, attempt)
+            print(f"[WARNING] {type(e).__name__} for equipment {equipment}, retry {attempt + 1} in {delay:.1f} s")
+            time.sleep(delay)
+
+
+def section_key(equipment, file_list):
+    """Cache key of a section: everything the model sees, plus the model."""
+    return section_cache.key({
+        "model": OANDM_MODEL,
+        "system": SYSTEM_PROMPT,
+        "prompt": section_prompt(equipment, file_list),
+    })
+
+
+def _generate_or_none(equipment, file_list, key):
+    try:
+        text = generate_section(equipment, file_list)
+    except Exception as gpt_error:
+        print("GPT error for equipment:", equipment, gpt_error)
+        return None
+    section_cache.set(key, text)
+    return text
+
+
+def generate_sections(equipment_sections, on_section=None):
+    """Cached or newly generated texts (None for failures) in the order of equipment_sections.
+
+    Only cache misses go to the API, concurrently; failures are not cached. on_section
+    (equipment, status) is called in this thread as each section is ready, with status
+    'cached', 'generated' or 'failed'; an exception it raises cancels the queued sections.
+    """
+    executor = get_llm_executor()
+    texts = {}
+    futures = {}
+    try:
+        for equipment, file_list in equipment_sections.items():
+            key = section_key(equipment, file_list)
+            cached = section_cache.get(key)
+            if cached is not None:
+                texts[equipment] = cached
+                if on_section is not None:
+                    on_section(equipment, "cached")
+            else:
+                futures[executor.submit(_generate_or_none, equipment, file_list, key)] = equipment
+
+        for future in as_completed(futures):
+            equipment = futures[future]
+            texts[equipment] = future.result()
+            if on_section is not None:
+                on_section(equipment, "failed" if texts[equipment] is None else "generated")
+    finally:
+        for future in futures:
+            future.cancel()
+    return [texts[equipment] for equipment in equipment_sections]
+
+
+def build_document(equipment_sections, texts):
+    doc = Document()
+    doc.add_heading("Operations & Maintenance Manual", 0)
+
+    for (equipment, file_list), gpt_text in zip(equipment_sections.items(), texts):
+        doc.add_page_break()
+        doc.add_heading(f"Equipment: {equipment}", level=1)
+        doc.add_paragraph("Included files:")
+        for f in file_list:
+            doc.add_paragraph(f"• {f}")
+        doc.add_paragraph(gpt_text if gpt_text is not None else FAILED_SECTION_TEXT)
+    return doc
+
+
+def document_path(folder_id):
+    """Absolute path of the manual generated for an upload folder."""
+    return os.path.abspath(os.path.join(GENERATED_FOLDER, f"{folder_id}.docx"))
+
+
+def save_upload(files):
+    """Store uploaded files in a new upload folder with a manifest of their original paths; returns the folder id."""
+    folder_id = str(uuid.uuid4())
+    folder_path = os.path.join(UPLOAD_FOLDER, folder_id)
+    os.makedirs(folder_path, exist_ok=True)
+
+    for file in files:
+        filename = secure_filename(file.filename)
+        full_path = os.path.join(folder_path, filename)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        file.save(full_path)
+
+    with open(os.path.join(folder_path, MANIFEST_NAME), "w") as f:
+        json.dump({"files": [file.filename for file in files]}, f)
+    return folder_id
+
+
+def load_manifest(folder_id):
+    """Original upload paths of an upload folder; raises FileNotFoundError."""
+    if secure_filename(folder_id) != folder_id:
+        raise FileNotFoundError(folder_id)
+    with open(os.path.join(UPLOAD_FOLDER, folder_id, MANIFEST_NAME)) as f:
+        return json.load(f)["files"]
+
+
+def run_manual(params, progress=None):
+    """Job entry point: build the manual for an upload folder ({"folder_id": ...}).
+
+    Reports each finished section through progress(). Every generated section is
+    cached as soon as it arrives, so a job that is rerun after a crash or restart only
+    calls the API for the sections that were still missing.
+    """
+    folder_id = params["folder_id"]
+    equipment_sections = group_files(load_manifest(folder_id))
+    sections = {equipment: "pending" for equipment in equipment_sections}
+
+    def on_section(equipment, status):
+        sections[equipment] = status
+        if progress is not None:
+            done = sum(1 for s in sections.values() if s != "pending")
+            progress(section=equipment, sections_done=done, sections_total=len(sections),
+                     sections=dict(sections))
+
+    if progress is not None:
+        progress(sections_done=0, sections_total=len(sections), sections=dict(sections))
+    texts = generate_sections(equipment_sections, on_section=on_section)
+    doc = build_document(equipment_sections, texts)
+
+    # The result goes to clients, so it names the upload folder rather than a server path
+    doc.save(document_path(folder_id))
+    return {
+        "folder_id": folder_id,
+        "sections": sections,
+        "failed": [equipment for equipment, status in sections.items() if status == "failed"],
+    }
+
+
+def submit_manual_job(folder_id):
+    try:
+        job = jobs_app.submit("oandm.manual", {"folder_id": folder_id})
+    except jobs_app.JobQueueFull as e:
+        return jsonify({"error": str(e)}), 429
+
+    summary = jobs_app.job_summary(job)
+    summary.update(
+        folder_id=folder_id,
+        events=url_for("oandm.manual_job_events", job_id=job["id"]),
+        document=url_for("oandm.manual_job_document", job_id=job["id"]),
+    )
+    return jobs_app.owned_response(summary, 202)
+
+
+def get_manual_job(job_id):
+    jobs_app.purge_expired_jobs()
+    job = jobs_app.jobs.get(job_id)
+    return job if job is not None and job["kind"] == "oandm.manual" else None
+
+
+@oandm_bp.route("/ping", methods=["GET"])
+def ping():
+    return jsonify({"message": "O&M module is alive."})
+
+@oandm_bp.route("/cache", methods=["GET"])
+def cache_stats():
+    return jsonify(section_cache.stats())
+
+@oandm_bp.route("/upload", methods=["POST"])
+def upload_files():
+    try:
+        files = request.files.getlist("files[]")
+        if not files:
+            return jsonify({"error": "No files received."}), 400
+
+        folder_id = save_upload(files)
+
+        # Generate the GPT sections in parallel, then assemble them in upload order
+        equipment_sections = group_files([file.filename for file in files])
+        texts = generate_sections(equipment_sections)
+        doc = build_document(equipment_sections, texts)
 
         # Save and return the document
-        output_path = os.path.join(GENERATED_FOLDER, f"{folder_id}.docx")
+        output_path = document_path(folder_id)
         doc.save(output_path)
         return send_file(output_path, as_attachment=True)
 
@@ -96,3 +332,58 @@ Be technical and realistic. Format with proper headings."""
         print("🔥 Upload error:")
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
+
+
+@oandm_bp.route("/jobs", methods=["POST"])
+def upload_files_job():
+    """Like /upload, but returns a job at once; the manual is generated by a job worker."""
+    try:
+        files = request.files.getlist("files[]")
+        if not files:
+            return jsonify({"error": "No files received."}), 400
+        return submit_manual_job(save_upload(files))
+
+    except Exception as e:
+        print("🔥 Upload error:")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@oandm_bp.route("/uploads/<folder_id>/jobs", methods=["POST"])
+def resume_manual_job(folder_id):
+    """Rerun the manual for an earlier upload, e.g. after a failed job or a server restart.
+
+    Sections already in the cache are reused, so only the missing ones are generated.
+    """
+    try:
+        load_manifest(folder_id)
+    except (FileNotFoundError, ValueError, KeyError):
+        return jsonify({"error": "Unknown upload folder."}), 404
+    return submit_manual_job(folder_id)
+
+@oandm_bp.route("/jobs/<job_id>", methods=["GET"])
+def manual_job_status(job_id):
+    job = get_manual_job(job_id)
+    if job is None:
+        return jobs_app.missing_job_response(job_id)
+    return jsonify(jobs_app.job_summary(job))
+
+@oandm_bp.route("/jobs/<job_id>/events", methods=["GET"])
+def manual_job_events(job_id):
+    """Server-Sent Events with per-section progress until the manual is finished."""
+    if get_manual_job(job_id) is None:
+        return jobs_app.missing_job_response(job_id)
+    return jobs_app.job_events(job_id)
+
+@oandm_bp.route("/jobs/<job_id>/document", methods=["GET"])
+def manual_job_document(job_id):
+    job = get_manual_job(job_id)
+    if job is None:
+        return jobs_app.missing_job_response(job_id)
+
+    status = jobs_app.job_status(job)
+    if status != "done":
+        return jsonify(jobs_app.job_summary(job)), 409 if status in ("queued", "running", "cancelling") else 410
+
+    result = job["future"].result()
+    return send_file(document_path(result["folder_id"]), as_attachment=True,
+                     download_name=f"OandM_manual_{result['folder_id']}.docx")
@@ -0,0 +1,133 @@
+"""Local stub of the OpenAI chat completions endpoint, and a check of oandm_app against it.
+
+    python oandm_stub_check.py            # run the check
+    python oandm_stub_check.py --serve    # only serve the stub, for manual testing with
+                                          # OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+
+The stub answers by equipment name (taken from the prompt):
+  RateLimited  429 with Retry-After on the first call, a section after that
+  BadRequest   400 on every call, which must not be retried
+  anything     a section after a delay that is longest for the first equipment, so
+               sections finish in the reverse of upload order
+"""
+import argparse
+import io
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RETRY_AFTER = 0.2  # seconds, sent with the 429
+
+# Calls per equipment name
+calls = {}
+_calls_lock = threading.Lock()
+
+
+def stub_section(equipment):
+    return f"Section for {equipment}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    delays = {}  # { equipment: seconds }
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=()):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-length', str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['content-length'])))
+        prompt = body['messages'][-1]['content']
+        equipment = prompt.split('Equipment: ', 1)[1].split('\n', 1)[0]
+        with _calls_lock:
+            calls[equipment] = calls.get(equipment, 0) + 1
+            n = calls[equipment]
+
+        if equipment == 'RateLimited' and n == 1:
+            self._send(429, {'error': {'message': 'Rate limit reached', 'type': 'rate_limit_error'}},
+                       headers=[('retry-after', str(RETRY_AFTER))])
+            return
+        if equipment == 'BadRequest':
+            self._send(400, {'error': {'message': 'Invalid request', 'type': 'invalid_request_error'}})
+            return
+
+        time.sleep(self.delays.get(equipment, 0.0))
+        self._send(200, {
+            'id': f'chatcmpl-stub-{equipment}-{n}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body['model'],
+            'choices': [{
+                'index': 0,
+                'finish_reason': 'stop',
+                'message': {'role': 'assistant', 'content': stub_section(equipment)},
+            }],
+        })
+
+
+def start_stub(host='127.0.0.1', port=0):
+    """Serve the stub in a daemon thread; returns the server (its port is server.server_address[1])."""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name='openai-stub').start()
+    return server
+
+
+def run_check():
+    """Upload a project through /upload against the stub and check the generated manual."""
+    server = start_stub()
+    # oandm_app reads these at import; keep the section cache in memory so nothing is reused
+    os.environ['OPENAI_BASE_URL'] = f'http://127.0.0.1:{server.server_address[1]}/v1'
+    os.environ.setdefault('OPENAI_API_KEY', 'stub')
+    os.environ['OANDM_CACHE_DIR'] = ''
+
+    from docx import Document
+    from flask import Flask
+    import oandm_app
+
+    equipment = ['Pump', 'RateLimited', 'Tank', 'BadRequest', 'Valve']
+    StubHandler.delays = {name: 0.1 * (len(equipment) - i) for i, name in enumerate(equipment)}
+
+    app = Flask(__name__)
+    app.register_blueprint(oandm_app.oandm_bp, url_prefix='/oandm')
+    files = [(io.BytesIO(b'stub'), f'{name}/datasheet.pdf') for name in equipment]
+    files.append((io.BytesIO(b'stub'), 'readme.txt'))
+    response = app.test_client().post('/oandm/upload', data={'files[]': files},
+                                      content_type='multipart/form-data')
+    server.shutdown()
+    assert response.status_code == 200, response.data
+
+    paragraphs = [p.text for p in Document(io.BytesIO(response.data)).paragraphs]
+    expected = []
+    for name in equipment + ['General']:
+        expected.append(f'Equipment: {name}')
+        expected.append(oandm_app.FAILED_SECTION_TEXT if name == 'BadRequest' else stub_section(name))
+    found = [p for p in paragraphs if p.startswith('Equipment: ') or p.startswith('Section for ')
+             or p == oandm_app.FAILED_SECTION_TEXT]
+    assert found == expected, f'sections out of order or missing: {found}'
+
+    assert calls['RateLimited'] == 2, f"429 was retried {calls['RateLimited'] - 1} times, expected once"
+    assert calls['BadRequest'] == 1, f"400 was retried {calls['BadRequest'] - 1} times, expected never"
+    print(f"OK: {len(equipment) + 1} sections in upload order, 429 retried once, 400 not retried")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='OpenAI stub for oandm_app.')
+    parser.add_argument('--serve', action='store_true', help='only serve the stub')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.serve:
+        print(f"OpenAI stub on http://127.0.0.1:{args.port}/v1")
+        ThreadingHTTPServer(('127.0.0.1', args.port), StubHandler).serve_forever()
+    else:
+        run_check()
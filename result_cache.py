@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """Content-addressed cache for simulation results.
+
+    Inputs are normalised (floats rounded to `decimals`, keys sorted) and hashed, so
+    requests that only differ below the tolerance share one entry. Results live in an
+    in-memory LRU and, if `disk_dir` is set, also as JSON files that every worker
+    process pointing at the same directory can read. Entries older than `max_age`
+    seconds are ignored, and once the files exceed `max_disk_bytes` the oldest are
+    deleted.
+    """
+
+    def __init__(self, name, max_entries=1024, disk_dir=None, decimals=6, max_age=None,
+                 max_disk_bytes=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.decimals = decimals
+        self.max_age = max_age
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_dir = os.path.join(disk_dir, name) if disk_dir else None
+        self._entries = OrderedDict()  # { key: (stored_at, value) }
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            if self.max_disk_bytes is not None:
+                self.prune()
+
+    def _normalise(self, value):
+        if isinstance(value, bool) or value is None:
+            return value
+        if isinstance(value, (int, float)):
+            return round(float(value), self.decimals) + 0.0  # + 0.0 folds -0.0 into 0.0
+        if isinstance(value, str):
+            return value.strip()
+        if isinstance(value, dict):
+            return {str(k): self._normalise(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._normalise(v) for v in value]
+        return str(value)
+
+    def key(self, inputs):
+        """Hash the normalised inputs into a cache key."""
+        payload = json.dumps(self._normalise(inputs), sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f'{key}.json')
+
+    def _expired(self, stored_at):
+        return self.max_age is not None and time.time() - stored_at > self.max_age
+
+    def get(self, key):
+        """Return the cached result or None."""
+        with self._lock:
+            if key in self._entries:
+                stored_at, value = self._entries[key]
+                if not self._expired(stored_at):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        if self.disk_dir:
+            path = self._path(key)
+            try:
+                stored_at = os.path.getmtime(path)
+                if not self._expired(stored_at):
+                    with open(path) as f:
+                        value = json.load(f)
+                    self._remember(key, value, stored_at)
+                    with self._lock:
+                        self.disk_hits += 1
+                    return value
+            except (OSError, ValueError):
+                pass
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _remember(self, key, value, stored_at=None):
+        with self._lock:
+            self._entries[key] = (stored_at or time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def set(self, key, value):
+        """Store a JSON-serialisable result."""
+        self._remember(key, value)
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file and rename so other workers never read a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(value, f)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[WARNING] Could not write {self.name} cache entry to disk: {e}")
+            return
+
+        if self.max_disk_bytes is not None:
+            with self._lock:
+                self._disk_bytes += size
+                over = self._disk_bytes > self.max_disk_bytes
+            if over:
+                self.prune()
+
+    def prune(self):
+        """Delete expired disk entries, then the oldest ones until the files fit in max_disk_bytes.
+
+        Other processes may share the directory, so the running total is rebuilt from a scan.
+        """
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for filename in names:
+                if filename.endswith('.json'):
+                    path = os.path.join(root, filename)
+                    try:
+                        info = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((info.st_mtime, info.st_size, path))
+        files.sort()
+
+        total = sum(size for _, size, _ in files)
+        # Prune to 90% of the limit so that the next few writes do not trigger another scan
+        target = None if self.max_disk_bytes is None else 0.9 * self.max_disk_bytes
+        removed = 0
+        for mtime, size, path in files:
+            if not self._expired(mtime) and (target is None or total <= target):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        with self._lock:
+            self._disk_bytes = total
+            self.evictions += removed
+        return removed
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else None,
+                'disk_dir': self.disk_dir,
+                'disk_bytes': self._disk_bytes if self.max_disk_bytes is not None else None,
+                'max_disk_bytes': self.max_disk_bytes,
+                'evictions': self.evictions,
+            }
+
+
+def cache_from_env(name, max_entries=1024, decimals=6):
+    """Build a cache whose disk tier is enabled by the RESULT_CACHE_DIR environment variable."""
+    max_age = os.getenv('RESULT_CACHE_MAX_AGE')
+    return ResultCache(
+        name,
+        max_entries=int(os.getenv('RESULT_CACHE_MAX_ENTRIES', max_entries)),
+        disk_dir=os.getenv('RESULT_CACHE_DIR') or None,
+        decimals=int(os.getenv('RESULT_CACHE_DECIMALS', decimals)),
+        max_age=float(max_age) if max_age else None,
+    )
@@ -0,0 +1,171 @@
+import io
+import json
+
+import numpy as np
+from flask import Response, jsonify, request
+
+try:
+    import orjson
+except ImportError:  # plain json fallback, slower but identical output
+    orjson = None
+
+try:
+    from tespy.components.component import component_registry
+    COMPONENT_TABLES = set(component_registry.items)
+except ImportError:  # older TESPy without the registry
+    COMPONENT_TABLES = set()
+
+# Names of nw.results tables: one per component class, plus the connection tables
+RESULT_TABLES = COMPONENT_TABLES | {'Connection', 'PowerConnection', 'Bus'}
+
+# Binary alternative to JSON, chosen through the Accept header
+BINARY_FORMATS = ['application/x-npz']
+
+
+def columnar_frame(df):
+    """One nw.results DataFrame as {'columns', 'index', 'data'}, data holding one array per column.
+
+    Numeric columns stay float64 arrays with NaN/Inf left in place; the encoders below
+    write those as null. Text columns (units, phase) become lists of str or None.
+    """
+    data = []
+    for name in df.columns:
+        column = df[name]
+        if column.dtype.kind in 'fiub':
+            data.append(np.ascontiguousarray(column.to_numpy(dtype=np.float64, na_value=np.nan)))
+        else:
+            values = column.to_numpy(dtype=object)
+            values[column.isna().to_numpy()] = None
+            data.append(values.tolist())
+    return {
+        'columns': [str(c) for c in df.columns],
+        'index': [str(i) for i in df.index],
+        'data': data,
+    }
+
+
+def columnar_results(results):
+    """All non-empty nw.results tables in columnar layout, keyed by component type."""
+    return {name: columnar_frame(df) for name, df in results.items() if not df.empty}
+
+
+def parse_fields(spec, kpis=()):
+    """Split a projection such as 'COP,Compressor.P,Connection.T,p' into (kpi names, tables).
+
+    `spec` is a comma-separated string or a list. A name from `kpis` selects that KPI,
+    'Table' selects a whole results table and 'Table.column' one of its columns; a
+    bare name after 'Table.column' is another column of the same table unless it names
+    a table in RESULT_TABLES. `tables` maps table names to a list of columns, or None
+    for all of them. Raises ValueError.
+    """
+    tokens = spec if isinstance(spec, list) else spec.split(',')
+    selected_kpis = []
+    tables = {}
+    table = None
+    for token in (str(t).strip() for t in tokens):
+        if not token:
+            continue
+        if token in kpis:
+            selected_kpis.append(token)
+            table = None
+        elif '.' in token:
+            table, column = token.split('.', 1)
+            if tables.get(table, []) is not None:
+                tables.setdefault(table, []).append(column)
+        elif token in RESULT_TABLES:
+            tables[token] = None
+            table = None
+        elif table is not None:
+            if tables[table] is not None:
+                tables[table].append(token)
+        elif token[:1].isupper() and not COMPONENT_TABLES:
+            # Without the registry any capitalised name may be a table; project_results checks it
+            tables[token] = None
+        else:
+            raise ValueError(f"Unknown field '{token}'. KPIs: {', '.join(kpis)}; "
+                             "tables as 'Compressor' or 'Connection.T,p'.")
+    unknown = [name for name in tables if COMPONENT_TABLES and name not in RESULT_TABLES]
+    if unknown:
+        raise ValueError(f"Unknown results tables {unknown}. Tables are TESPy component classes "
+                         "such as 'Compressor', or 'Connection'.")
+    return selected_kpis, tables
+
+
+def project_results(results, tables):
+    """columnar_results restricted to the selected tables and columns; raises ValueError for unknown ones."""
+    projected = {}
+    for name, columns in tables.items():
+        df = results.get(name)
+        if df is None or df.empty:
+            available = ', '.join(k for k, v in results.items() if not v.empty)
+            raise ValueError(f"No results table '{name}'. Available: {available}")
+        if columns is not None:
+            missing = [c for c in columns if c not in df.columns]
+            if missing:
+                raise ValueError(f"Unknown {name} columns {missing}. Available: {', '.join(df.columns)}")
+            df = df[columns]
+        projected[name] = columnar_frame(df)
+    return projected
+
+
+def _nulled(array):
+    values = array.astype(object)
+    values[~np.isfinite(array)] = None
+    return values.tolist()
+
+
+def _plain(obj):
+    """Fallback for the json module: arrays and NumPy scalars as JSON values, NaN/Inf as null."""
+    if isinstance(obj, dict):
+        return {k: _plain(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_plain(v) for v in obj]
+    if isinstance(obj, np.ndarray):
+        return _nulled(obj) if obj.dtype.kind == 'f' else obj.tolist()
+    if isinstance(obj, (float, np.floating)):
+        return float(obj) if np.isfinite(obj) else None
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def dumps(obj):
+    """JSON bytes with NaN/Inf as null; NumPy arrays are encoded directly when orjson is available."""
+    if orjson is not None:
+        # orjson already writes NaN/Inf as null, for floats and float arrays alike
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(_plain(obj), allow_nan=False).encode()
+
+
+def _npz_arrays(results):
+    arrays = {}
+    for name, table in results.items():
+        arrays[f'{name}/index'] = np.asarray(table['index'], dtype=str)
+        for column, values in zip(table['columns'], table['data']):
+            if isinstance(values, np.ndarray):
+                arrays[f'{name}/{column}'] = values
+            else:
+                arrays[f'{name}/{column}'] = np.asarray(['' if v is None else v for v in values], dtype=str)
+    return arrays
+
+
+def results_response(payload, formats=BINARY_FORMATS):
+    """Encode a payload whose 'results' (if any) came from columnar_results, per the Accept header.
+
+    JSON is the default. application/x-npz carries one array per table column, named
+    '<table>/<column>' plus '<table>/index', with the rest of the payload as JSON in the
+    X-Result-Meta header.
+    """
+    mimetype = request.accept_mimetypes.best_match(['application/json', *formats],
+                                                   default='application/json')
+    if mimetype == 'application/json' or 'results' not in payload:
+        return Response(dumps(payload), content_type='application/json')
+
+    if mimetype == 'application/x-npz':
+        meta = {k: v for k, v in payload.items() if k != 'results'}
+        buf = io.BytesIO()
+        np.savez(buf, **_npz_arrays(payload['results']))
+        return Response(buf.getvalue(), mimetype=mimetype,
+                        headers={'X-Result-Meta': dumps(meta).decode()})
+
+    return jsonify({'error': f'Unsupported format {mimetype}.'}), 406